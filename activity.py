@@ -16,15 +16,16 @@
 
 import os
 import time
-import json
 import logging
 from gettext import gettext as _
 
 import dbus
 from gi.repository import Gtk
 from gi.repository import Gdk
+from gi.repository import GLib
 from gi.repository import Pango
 
+from sugar3 import profile
 from sugar3.activity import activity
 from sugar3.datastore import datastore
 from sugar3.graphics.alert import Alert
@@ -34,6 +35,7 @@ from sugar3.activity.widgets import ActivityToolbarButton
 from sugar3.activity.widgets import StopButton
 from sugar3.graphics import style
 from sugar3.graphics.icon import Icon
+from sugar3.graphics.iconentry import IconEntry, ICON_ENTRY_PRIMARY
 
 from sugar3.datastore import datastore
 from sugar3.graphics.objectchooser import ObjectChooser
@@ -53,8 +55,17 @@ except ImportError:
 from add_button import AddToolButton
 from add_window import EntryWindow
 from browsewindow import BrowseImportWindow
-from bib_types import ALL_TYPES, ALL_TYPE_NAMES
+from bib_types import ALL_TYPES, ALL_TYPE_NAMES, TYPES_BY_ID
+from bib_types import save_catalog_cache
 from main_list import MainList
+from sort_button import SortToolButton
+from sorting import make_sort_key
+from entry import Entry, POOL
+from export import ExportJob, ExportTarget, FragmentCache
+from export import HTMLFormat, AbiWordFormat
+from export_button import ExportToolButton
+from importer import ImportJob
+from jsonstream import iter_array
 
 
 class BibliographyActivity(activity.Activity):
@@ -64,6 +75,18 @@ class BibliographyActivity(activity.Activity):
         self._has_read_file = False
         self._collab = CollabWrapper(self)
         self._collab.message.connect(self.__message_cb)
+        self._collab.joined.connect(self.__collab_joined_cb)
+        self._collab.buddy_joined.connect(self.__buddy_joined_cb)
+        self._collab.buddy_left.connect(self.__buddy_left_cb)
+        # Keys of the buddies that said they understand add_items
+        self._add_items_buddies = set()
+        # ExportJob -> (jobject, progress alert, message when done)
+        self._exports = {}
+        # DocumentFormat.name -> FragmentCache
+        self._export_caches = {}
+        # ImportJob -> (jobject, progress alert)
+        self._imports = {}
+        self._duplicate_alerts = []
 
         screen = Gdk.Screen.get_default()
         css_provider = Gtk.CssProvider.get_default()
@@ -90,7 +113,13 @@ class BibliographyActivity(activity.Activity):
         activity_button.props.page.insert(abiword, -1)
         abiword.show()
 
-        add_button = AddToolButton(ALL_TYPE_NAMES)
+        export = ExportToolButton()
+        export.connect('export', self.__export_cb)
+        activity_button.props.page.insert(export, -1)
+        export.show()
+
+        add_button = AddToolButton(
+            [ALL_TYPES[name] for name in ALL_TYPE_NAMES])
         add_button.connect('add-type', self.__add_type_cb)
         toolbar_box.toolbar.insert(add_button, -1)
         add_button.show()
@@ -100,6 +129,37 @@ class BibliographyActivity(activity.Activity):
         browse.connect('clicked', self.__import_from_browse_cb)
         toolbar_box.toolbar.insert(browse, -1)
         browse.show()
+
+        import_file = ToolButton('document-open')
+        import_file.set_tooltip(_('Add Entries from a BibTeX, RIS or CSV'
+                                  ' File'))
+        import_file.connect('clicked', self.__import_file_cb)
+        toolbar_box.toolbar.insert(import_file, -1)
+        import_file.show()
+
+        sort_button = SortToolButton()
+        sort_button.connect('sort-changed', self.__sort_changed_cb)
+        toolbar_box.toolbar.insert(sort_button, -1)
+        sort_button.show()
+
+        duplicates = ToolButton('edit-duplicate')
+        duplicates.set_tooltip(_('Find Duplicates'))
+        duplicates.connect('clicked', self.__find_duplicates_cb)
+        toolbar_box.toolbar.insert(duplicates, -1)
+        duplicates.show()
+
+        search_item = Gtk.ToolItem()
+        self._search_entry = IconEntry()
+        self._search_entry.set_icon_from_name(
+            ICON_ENTRY_PRIMARY, 'system-search')
+        self._search_entry.add_clear_button()
+        self._search_entry.set_placeholder_text(_('Search'))
+        self._search_entry.set_size_request(style.GRID_CELL_SIZE * 5, -1)
+        self._search_entry.connect('changed', self.__search_changed_cb)
+        search_item.add(self._search_entry)
+        self._search_entry.show()
+        toolbar_box.toolbar.insert(search_item, -1)
+        search_item.show()
    
         separator = Gtk.SeparatorToolItem()
         separator.props.draw = False
@@ -132,13 +192,14 @@ class BibliographyActivity(activity.Activity):
         self._empty_message.show()
 
         self._collab.setup()
+        GLib.idle_add(save_catalog_cache)
 
-    def add_item(self, text, type_, data):
+    def add_item(self, entry):
         self._empty_message.hide()
         self.set_canvas(self._main_sw)
         self._main_sw.show()
         self._main_list.show()
-        self._main_list.add(text, type_, data)
+        return self._main_list.add(entry)
 
     def __message_cb(self, collab, buddy, msg):
         action = msg.get('action')
@@ -146,28 +207,77 @@ class BibliographyActivity(activity.Activity):
             return
 
         args = msg.get('args')
-        if action == 'add_item':
-            self.add_item(*args)
+        if action == 'features':
+            if buddy is not None and 'add_items' in args:
+                self._add_items_buddies.add(buddy.props.key)
+        elif action == 'add_item':
+            self.add_item(Entry.from_json(args))
+        elif action == 'add_items':
+            self._load_entries([Entry.from_json(data) for data in args])
         elif action == 'delete_row':
+            if isinstance(args, list):
+                # Older versions send the whole row, which hashes to the
+                # id it was given when added
+                args = Entry.from_json(args).id
             self._main_list.delete(args)
         elif action == 'edit_item':
-            self._main_list.edited_via_collab(msg.get('path'), args)
+            if 'path' in msg:
+                # Older versions only send the new row and its position
+                # in their list, which doesn't say which entry it was
+                logging.error('Ignoring an edit from an older version')
+                return
+            self._main_list.edited_via_collab(Entry.from_json(args))
         else:
             logging.error('Got message that is weird %r', msg)
 
+    def _post_features(self):
+        # Older versions log this as a weird message and carry on
+        self._collab.post(dict(action='features', args=['add_items']))
+
+    def __collab_joined_cb(self, collab):
+        self._post_features()
+
+    def __buddy_joined_cb(self, collab, buddy):
+        self._post_features()
+
+    def __buddy_left_cb(self, collab, buddy):
+        self._add_items_buddies.discard(buddy.props.key)
+
+    def _post_entries(self, entries):
+        '''
+        Shares new entries with the other buddies, as one message if all
+        of them understand it, else as one message for each entry
+        '''
+        buddies = self.shared_activity.get_joined_buddies() \
+            if self.shared_activity else []
+        own_key = profile.get_pubkey()
+        if all(buddy.props.key in self._add_items_buddies
+               for buddy in buddies if buddy.props.key != own_key):
+            self._collab.post(dict(
+                action='add_items',
+                args=[entry.to_json() for entry in entries]
+            ))
+            return
+        for entry in entries:
+            self._collab.post(dict(
+                action='add_item',
+                args=entry.to_json()
+            ))
+
     def __add_type_cb(self, add_button, type_):
-        window = EntryWindow(ALL_TYPES[type_], self)
+        window = EntryWindow(TYPES_BY_ID[type_], self)
         window.connect('save-item', self.__save_item_cb)
         window.show()
     
-    def __save_item_cb(self, window, *args):
-        self.add_item(*args)
+    def __save_item_cb(self, window, entry):
+        self.add_item(entry)
         window.hide()
         self._collab.post(dict(
             action='add_item',
-            args=args
+            args=entry.to_json()
         ))
         window.destroy()
+        self._check_duplicates(entry)
 
     def __import_from_browse_cb(self, button):
         chooser = ObjectChooser(parent=self,
@@ -191,27 +301,162 @@ class BibliographyActivity(activity.Activity):
     def _load_browse(self, jobject):
         if jobject and jobject.file_path:
             with open(jobject.file_path) as f:
-                data = json.load(f)
-            window = BrowseImportWindow(data, self, jobject)
+                links = list(iter_array(f, 'shared_links'))
+            window = BrowseImportWindow(links, self, jobject)
             window.connect('save-item', self.__save_item_importer_cb)
             window.connect('try-again', self.__try_again_cb)
             window.show()
 
-    def __save_item_importer_cb(self, window, *args):
-        self.add_item(*args)
+    def __save_item_importer_cb(self, window, entry):
+        self.add_item(entry)
         self._collab.post(dict(
             action='add_item',
-            args=args
+            args=entry.to_json()
         ))
+        self._check_duplicates(entry)
+
+    def __import_file_cb(self, button):
+        chooser = ObjectChooser(parent=self)
+        result = chooser.run()
+
+        jobject = None
+        if result == Gtk.ResponseType.ACCEPT:
+            jobject = chooser.get_selected_object()
+        chooser.destroy()
+        del chooser
+
+        if jobject and jobject.file_path:
+            self._import_file(jobject)
+
+    def _import_file(self, jobject):
+        job = ImportJob(jobject.file_path,
+                        jobject.metadata.get('mime_type'),
+                        self.__import_progress_cb, self.__import_done_cb)
+
+        alert = Alert()
+        alert.props.title = _('Importing')
+        alert.add_button(Gtk.ResponseType.CANCEL, _('Cancel'),
+                         Icon(icon_name='dialog-cancel'))
+        alert.connect('response', self.__import_response_cb, job)
+        self.add_alert(alert)
+        alert.show_all()
+
+        self._imports[job] = (jobject, alert)
+        self.__import_progress_cb(job, 0)
+        job.start()
+
+    def __import_progress_cb(self, job, done):
+        if job in self._imports:
+            alert = self._imports[job][1]
+            alert.props.msg = _('{} entries read').format(done)
+
+    def __import_response_cb(self, alert, response_id, job):
+        job.cancel()
+
+    def __import_done_cb(self, job):
+        jobject, alert = self._imports.pop(job)
+        self.remove_alert(alert)
+        jobject.destroy()
+
+        if job.cancelled:
+            return
+        if job.error is not None:
+            self._error_alert(_('The file could not be imported'))
+            return
+
+        entries = self._main_list.import_entries(job.entries, job.prepared)
+        if entries:
+            self._empty_message.hide()
+            self.set_canvas(self._main_sw)
+            self._main_sw.show()
+            self._main_list.show()
+            self._post_entries(entries)
+
+        msg = _('{} entries were added').format(len(entries))
+        if job.skipped:
+            msg += ' ' + _('({} without a title or author were skipped)') \
+                .format(job.skipped)
+        alert = Alert()
+        alert.props.title = _('Import Finished')
+        alert.props.msg = msg
+        alert.add_button(Gtk.ResponseType.OK, _('Ok'),
+                         Icon(icon_name='dialog-ok'))
+        alert.connect('response', self.__dismiss_response_cb)
+        self.add_alert(alert)
+        alert.show_all()
+
+    def _check_duplicates(self, entry):
+        if self._main_list.duplicates_of(entry.id):
+            self._duplicates_alert(
+                _('Possible Duplicate'),
+                _('The new entry looks the same as one already in your'
+                  ' bibliography'),
+                _('Remove New Entry'), [entry.id])
+
+    def __find_duplicates_cb(self, button):
+        copies = self._main_list.find_duplicates()
+        if not copies:
+            self._duplicates_alert(_('No Duplicates'),
+                                   _('No entries look like copies of'
+                                     ' other entries'))
+            return
+        self._duplicates_alert(
+            _('Duplicates Found'),
+            _('{} entries look like copies of other entries')
+            .format(len(copies)),
+            _('Remove Copies'), copies)
 
-    def __edit_row_cb(self, tree_view, type_, json_string):
-        previous_values = json.loads(json_string)
-        window = EntryWindow(ALL_TYPES[type_], self, previous_values)
+    def _duplicates_alert(self, title, msg, remove_label=None, ids=()):
+        alert = Alert()
+        alert.props.title = title
+        alert.props.msg = msg
+
+        if remove_label is not None:
+            alert.add_button(Gtk.ResponseType.APPLY, remove_label,
+                             Icon(icon_name='edit-delete'))
+            alert.add_button(Gtk.ResponseType.CANCEL, _('Keep'),
+                             Icon(icon_name='dialog-cancel'))
+        else:
+            alert.add_button(Gtk.ResponseType.OK, _('Ok'),
+                             Icon(icon_name='dialog-ok'))
+
+        # Only the newest duplicates alert is kept, other alerts (eg. the
+        # progress of an export) are left alone
+        for other in list(self._duplicate_alerts):
+            self._remove_duplicates_alert(other)
+
+        self.add_alert(alert)
+        self._duplicate_alerts.append(alert)
+        alert.connect('response', self.__duplicates_response_cb, ids)
+        alert.show_all()
+
+    def _remove_duplicates_alert(self, alert):
+        self._duplicate_alerts.remove(alert)
+        self.remove_alert(alert)
+
+    def __duplicates_response_cb(self, alert, response_id, ids):
+        if response_id is Gtk.ResponseType.APPLY:
+            for id_ in ids:
+                self._main_list.delete(id_)
+                self._collab.post(dict(
+                    action='delete_row',
+                    args=id_
+                ))
+        self._remove_duplicates_alert(alert)
+
+    def __edit_row_cb(self, tree_view, entry):
+        window = EntryWindow(entry.bib_type, self, list(entry.values))
         window.connect('save-item', tree_view.edited_row_cb)
         window.show()
 
-    def __deleted_row_cb(self, tree_view, *row):
-        if len(tree_view.get_model()) == 0:
+    def __sort_changed_cb(self, button, sort, group):
+        self._main_list.set_sort_key(make_sort_key(sort, group))
+
+    def __search_changed_cb(self, entry):
+        self._main_list.search(entry.get_text())
+
+    def __deleted_row_cb(self, tree_view, id_):
+        if tree_view.is_empty():
             self._main_list.hide()
             self.set_canvas(self._empty_message)
             self._empty_message.show()
@@ -233,74 +478,115 @@ class BibliographyActivity(activity.Activity):
             return False
 
     def __export_as_html_cb(self, button):
-        jobject = datastore.create()
-        jobject.metadata['title'] = \
-            _('{} as HTML').format(self.metadata['title'])
-        jobject.metadata['mime_type'] = 'text/html'
-        preview = self.get_preview()
-        if preview is not None:
-            jobject.metadata['preview'] = dbus.ByteArray(preview)
-
-        # write out the document contents in the requested format
-        path = os.path.join(self.get_activity_root(),
-                            'instance', str(time.time()))
-        with open(path, 'w') as f:
-            f.write('''<html>
-                         <head>
-                           <title>{title}</title>
-                         </head>
-
-                         <body>
-                           <h1>{title}</h1>
-                    '''.format(title=jobject.metadata['title']))
-            for item in self._main_list.all():
-                f.write('<p>{}</p>'.format(
-                    item[self._main_list.COLUMN_TEXT]))
-            f.write('''
-                         </body>
-                       </html>
-                    ''')
-        jobject.file_path = path
-
-        datastore.write(jobject, transfer_ownership=True)
-        self._journal_alert(jobject.object_id, _('Success'), _('Your'
-                            ' Bibliography was saved to the journal as HTML'))
-        jobject.destroy()
-        del jobject
+        self._export([HTMLFormat()],
+                     _('Your Bibliography was saved to the journal as HTML'))
 
     def __export_as_abiword_cb(self, button):
-        jobject = datastore.create()
-        jobject.metadata['title'] = \
-            _('{} as Write document').format(self.metadata['title'])
-        jobject.metadata['mime_type'] = 'application/x-abiword'
+        self._export([AbiWordFormat()],
+                     _('Your Bibliography was saved to the journal as a'
+                       ' Write document'))
+
+    def __export_cb(self, button, formats):
+        self._export(formats,
+                     _('Your Bibliography was saved to the journal in {}'
+                       ' formats').format(len(formats)))
+
+    def _export(self, formats, success_msg):
+        titles = {
+            'html': _('{} as HTML'),
+            'abiword': _('{} as Write document'),
+            'bibtex': _('{} as BibTeX'),
+            'ris': _('{} as RIS'),
+            'csv': _('{} as CSV'),
+        }
         preview = self.get_preview()
-        if preview is not None:
-            jobject.metadata['preview'] = dbus.ByteArray(preview)
-
-        path = os.path.join(self.get_activity_root(),
-                            'instance', str(time.time()))
-        with open(path, 'w') as f:
-            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<abiword>\n'
-                    '<section>')
-            entries = []
-            for item in self._main_list.all():
-                markup = item[self._main_list.COLUMN_TEXT]
-                abiword = '<p><c>{}</c></p>'.format(markup) \
-                    .replace('<b>', '<c props="font-weight:bold">') \
-                    .replace('<i>', '<c props="font-style:italic;'
-                             ' font-weight:normal">') \
-                    .replace('</b>', '</c>').replace('</i>', '</c>')
-                entries.append(abiword)
-            f.write('\n<p><c></c></p>\n'.join(entries))
-            f.write('</section>\n</abiword>')
-        jobject.file_path = path
-
-        datastore.write(jobject, transfer_ownership=True)
-        self._journal_alert(jobject.object_id, _('Success'), _('Your'
-                            ' Bibliography was saved to the journal as a Write'
-                            ' document'))
-        jobject.destroy()
-        del jobject
+
+        targets = []
+        jobjects = []
+        for document_format in formats:
+            jobject = datastore.create()
+            jobject.metadata['title'] = \
+                titles[document_format.name].format(self.metadata['title'])
+            jobject.metadata['mime_type'] = document_format.mime_type
+            if preview is not None:
+                jobject.metadata['preview'] = dbus.ByteArray(preview)
+            jobjects.append(jobject)
+
+            # write out the document contents in the requested format
+            path = os.path.join(self.get_activity_root(), 'instance',
+                                '{}-{}'.format(time.time(),
+                                               document_format.name))
+            targets.append(ExportTarget(path, document_format,
+                                        jobject.metadata['title'],
+                                        self._export_cache(document_format)))
+
+        job = ExportJob(self._main_list.all(), targets,
+                        self.__export_progress_cb, self.__export_done_cb)
+
+        alert = Alert()
+        alert.props.title = _('Exporting')
+        alert.add_button(Gtk.ResponseType.CANCEL, _('Cancel'),
+                         Icon(icon_name='dialog-cancel'))
+        alert.connect('response', self.__export_response_cb, job)
+        self.add_alert(alert)
+        alert.show_all()
+
+        self._exports[job] = (jobjects, alert, success_msg)
+        self.__export_progress_cb(job, 0)
+        job.start()
+
+    def _export_cache(self, document_format):
+        cache = self._export_caches.get(document_format.name)
+        if cache is None:
+            path = os.path.join(self.get_activity_root(), 'instance',
+                                'export-{}.json'.format(document_format.name))
+            cache = self._export_caches[document_format.name] = \
+                FragmentCache(path)
+        return cache
+
+    def __export_progress_cb(self, job, done):
+        if job in self._exports:
+            alert = self._exports[job][1]
+            alert.props.msg = _('{} of {} entries').format(done, job.total)
+
+    def __export_response_cb(self, alert, response_id, job):
+        job.cancel()
+
+    def __export_done_cb(self, job):
+        jobjects, alert, success_msg = self._exports.pop(job)
+        self.remove_alert(alert)
+
+        if job.cancelled or job.error is not None:
+            for target, jobject in zip(job.targets, jobjects):
+                if os.path.exists(target.path):
+                    os.unlink(target.path)
+                jobject.destroy()
+            if job.error is not None:
+                self._error_alert(_('Your Bibliography could not be'
+                                    ' exported'))
+            return
+
+        for target, jobject in zip(job.targets, jobjects):
+            jobject.file_path = target.path
+            datastore.write(jobject, transfer_ownership=True)
+        # With several documents, the alert opens the last one
+        self._journal_alert(jobject.object_id, _('Success'), success_msg)
+        for jobject in jobjects:
+            jobject.destroy()
+        del jobjects
+
+    def _error_alert(self, msg):
+        alert = Alert()
+        alert.props.title = _('Error')
+        alert.props.msg = msg
+        alert.add_button(Gtk.ResponseType.OK, _('Ok'),
+                         Icon(icon_name='dialog-ok'))
+        alert.connect('response', self.__dismiss_response_cb)
+        self.add_alert(alert)
+        alert.show_all()
+
+    def __dismiss_response_cb(self, alert, response_id):
+        self.remove_alert(alert)
 
     def _journal_alert(self, object_id, title, msg):
         alert = Alert()
@@ -337,14 +623,19 @@ class BibliographyActivity(activity.Activity):
     def write_file(self, file_path):
         if self._main_list is None:
             return  # WhataTerribleFailure
-        data = self._main_list.all()
-        with open(file_path, 'w') as f:
-            json.dump(data, f)
+        log = self._main_list.log
+        log.write(file_path)
+
+        # Saves without changes don't change the version, so the saved
+        # index still matches
+        index = self._main_list.search_index
+        if index.dirty:
+            index.save(self._search_index_path(), log.version)
 
         self.metadata['mime_type'] == 'application/json+bib'
 
     def get_data(self):
-        return self._main_list.all()
+        return [entry.to_json() for entry in self._main_list.all()]
 
     def read_file(self, file_path):
         # FIXME: Why does sugar call read_file so many times?
@@ -352,13 +643,25 @@ class BibliographyActivity(activity.Activity):
             return
         self._has_read_file = True
 
-        with open(file_path) as f:
-            l = json.load(f)
-        self.set_data(l)
+        log = self._main_list.log
+        l = log.read(file_path)
+        # Entries that are in a matching saved index aren't indexed again
+        self._main_list.search_index.load(self._search_index_path(),
+                                          log.version)
+        self._load_entries(l, log=False)
+        logging.debug('String pool after reading: %r', POOL.report())
+
+    def _search_index_path(self):
+        return os.path.join(self.get_activity_root(), 'data',
+                            'search-{}.json'.format(self._jobject.object_id))
 
     def set_data(self, l):
+        self._load_entries([Entry.from_json(data) for data in l])
+        logging.debug('String pool after sharing: %r', POOL.report())
+
+    def _load_entries(self, l, log=True):
         if len(l) > 0:
-            self._main_list.load_json(l)
+            self._main_list.load_entries(l, log=log)
             self._empty_message.hide()
             self.set_canvas(self._main_sw)
             self._main_sw.show()
@@ -25,6 +25,46 @@ from sugar3.graphics.iconentry import IconEntry, ICON_ENTRY_PRIMARY
 from sugar3.graphics import style
 
 
+class TypeIndex(object):
+    '''
+    Substring search over some text for each type.  Every substring of
+    up to 3 characters maps to the types that contain it, so short
+    queries are a single lookup.  Longer queries intersect the sets for
+    each of their trigrams and only check the few types left.
+
+    Args:
+        texts (list[list[str]]): the strings to search for each type
+    '''
+
+    def __init__(self, texts):
+        self._texts = ['\n'.join(t).lower() for t in texts]
+        self._grams = {}
+        for i, text in enumerate(self._texts):
+            for n in range(1, 4):
+                for start in range(len(text) - n + 1):
+                    gram = text[start:start + n]
+                    if '\n' not in gram:
+                        self._grams.setdefault(gram, set()).add(i)
+
+    def search(self, query):
+        '''
+        Returns the set of indexes of the types matching the query, or
+        None if every type matches
+        '''
+        query = query.lower()
+        if not query:
+            return None
+        if len(query) <= 3:
+            return self._grams.get(query, set())
+
+        sets = sorted((self._grams.get(query[i:i + 3], set())
+                       for i in range(len(query) - 2)), key=len)
+        found = set(sets[0])
+        for s in sets[1:]:
+            found &= s
+        return set(i for i in found if query in self._texts[i])
+
+
 class AddToolButton(ToolButton):
 
     __gsignals__ = {
@@ -39,20 +79,33 @@ class AddToolButton(ToolButton):
         self.palette_invoker.props.lock_palette = True
         self._p = self.get_palette()
 
+        # The treeview and index are made the first time the palette
+        # opens, so they don't slow down starting the activity
+        self._types = types
+        self._index = None
+        self._matches = None
+        self._popup_hid = self._p.connect('popup', self.__popup_cb)
+
+    def __popup_cb(self, palette):
+        self._p.disconnect(self._popup_hid)
+
         self._search_box = IconEntry()
         self._search_box.add_clear_button()
         self._search_box.set_icon_from_name(
             ICON_ENTRY_PRIMARY, 'system-search')
         self._search_box.show()
 
-        types_store = Gtk.ListStore(str)
-        for i in types:
-            types_store.append([i])
+        types_store = Gtk.ListStore(str, str, int)
+        for i, t in enumerate(self._types):
+            types_store.append([t.name, t.id, i])
+        self._index = TypeIndex(
+            [[t.name, t.type] + t.labels +
+             [label for label, example in t.items]
+             for t in self._types])
 
         self._filter_model = types_store.filter_new()
         self._filter_model.set_visible_func(self.__model_filter_cb)
-        self._search_box.connect('changed',
-                                 lambda *args: self._filter_model.refilter())
+        self._search_box.connect('changed', self.__search_changed_cb)
         self._search_box.connect('activate', self.__search_box_activate_cb)
 
         treeview = Gtk.TreeView(self._filter_model)
@@ -80,19 +133,23 @@ class AddToolButton(ToolButton):
         box.add(sw)
         box.show()
         self._p.set_content(box)
-        
+
     def __row_clicked_cb(self, treevieew, path, view_column):
         row = self._filter_model.get_iter(path)
-        type_ = self._filter_model.get_value(row, 0)
+        type_ = self._filter_model.get_value(row, 1)
         self.emit('add-type', type_)
         self._p.popdown()
-        
+
+    def __search_changed_cb(self, entry):
+        self._matches = self._index.search(entry.get_text())
+        self._filter_model.refilter()
+
     def __model_filter_cb(self, model, iter, data):
-        return self._search_box.get_text().lower() in \
-            model.get(iter, 0)[0].lower()
+        return self._matches is None or model.get_value(iter, 2) in \
+            self._matches
 
     def __search_box_activate_cb(self, entry):
         row = self._filter_model.get_iter(Gtk.TreePath.new_first())
-        type_ = self._filter_model.get_value(row, 0)
+        type_ = self._filter_model.get_value(row, 1)
         self.emit('add-type', type_)
         self._p.popdown()
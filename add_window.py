@@ -15,19 +15,18 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
 import math
-import json
 import logging
 from datetime import date
 from gettext import gettext as _
 
 from gi.repository import Gtk
 from gi.repository import Gdk
-from gi.repository import GLib
 from gi.repository import GObject
 
 from sugar3.graphics import style
 from sugar3.graphics.toolbutton import ToolButton
 from popwindow import PopWindow
+from entry import Entry
 
 
 def get_toplevel_size(toplevel):
@@ -125,24 +124,16 @@ class EntryWidget(Gtk.EventBox):
     
     def get_data(self):
         '''
-        Returns the state of the entry window as a tuple of:
-
-        * String of markup
-        * Type name (`BibType.type`)
-        * JSON dump of the values (good for use with `previous_values`)
+        Returns the state of the entry window as a new `Entry`
         '''
-        values = []
-        for e in self._text_entries:
-            values.append(e.get_text())
-        result = self._type.format(map(GLib.markup_escape_text, values))
-        
-        return (result, self._type.type, json.dumps(values))
+        return Entry(self._type.id,
+                     [e.get_text() for e in self._text_entries])
 
 
 class EntryWindow(PopWindow):
 
     __gsignals__ = {
-        'save-item': (GObject.SIGNAL_RUN_FIRST, None, (str, str, str))
+        'save-item': (GObject.SIGNAL_RUN_FIRST, None, (object,))
     }
 
     def __init__(self, bib_type, toplevel, previous_values=None):
@@ -164,4 +155,4 @@ class EntryWindow(PopWindow):
         self._entry.show()
 
     def __add_bib_cb(self, button):
-        self.emit('save-item', *self._entry.get_data())
+        self.emit('save-item', self._entry.get_data())
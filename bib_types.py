@@ -14,35 +14,424 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+import os
+import re
+import marshal
 import logging
-from gettext import gettext as _
+import threading
+from string import Formatter
+from operator import itemgetter
+from collections import OrderedDict
+from gettext import gettext, textdomain, bindtextdomain
+from gettext import find as find_catalog
 
 ALL_TYPES = {}
 ALL_TYPE_NAMES = []
 WEB_TYPES = []
+# Keyed by the untranslated `BibType.type`
+TYPES_BY_TYPE = {}
+# Keyed by the stable `BibType.id`, as stored in entries
+TYPES_BY_ID = {}
+
+# What the fields are for, by their untranslated labels.  Types without
+# an author are cited by their title instead.
+FIELD_ROLES = {
+    'author': frozenset([
+        'Last Name', 'Author 1 Last Name', 'Editor Last Name',
+        'Screen Name or User Name', 'Name of Organisation']),
+    'year': frozenset([
+        'Year of Publication', 'Year Created', 'Year of Broadcast',
+        'Last Update']),
+    'title': frozenset([
+        'Title', 'Title of Article', 'Tite of Article',
+        'Title or Description', 'Title of Webpage', 'Episode Title']),
+    'accessed': frozenset(['Accessed']),
+}
+
+
+def _(message):
+    # Only marks the strings for translation.  They are translated when
+    # they are first used, or read already translated from the cache.
+    return message
+
+
+def _catalog_key():
+    # The same languages gettext would look at
+    for name in ('LANGUAGE', 'LC_ALL', 'LC_MESSAGES', 'LANG'):
+        language = os.environ.get(name)
+        if language:
+            break
+    # A new bundle can change the translations without this file
+    domain = textdomain()
+    catalog = find_catalog(domain, bindtextdomain(domain))
+    catalog_mtime = os.path.getmtime(catalog) if catalog else None
+    return (language or 'C', os.path.getmtime(__file__), catalog_mtime)
+
+
+def _catalog_cache_path():
+    root = os.environ.get('SUGAR_ACTIVITY_ROOT')
+    if root is None:
+        return None
+    return os.path.join(root, 'data', 'bib_types.cache')
+
+
+def _load_catalog_cache():
+    path = _catalog_cache_path()
+    if path is None:
+        return {}
+    try:
+        with open(path, 'rb') as f:
+            key, catalog = marshal.load(f)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return {}
+    if key != _catalog_key():
+        return {}
+    return catalog
+
+# Type -> (translated name, parsed items), from the last time this locale
+# and version of the catalog was used
+_CATALOG = _load_catalog_cache()
+
+
+def save_catalog_cache():
+    '''
+    Save the translated and parsed catalog, so that the next launch with
+    the same locale doesn't have to translate and parse it again
+    '''
+    path = _catalog_cache_path()
+    if path is None or _CATALOG:
+        return
+    catalog = dict((t.type, (t.name, t.items))
+                   for t in TYPES_BY_TYPE.values())
+    try:
+        with open(path + '.tmp', 'wb') as f:
+            marshal.dump((_catalog_key(), catalog), f)
+        os.rename(path + '.tmp', path)
+    except (IOError, OSError) as e:
+        logging.error('Could not save the bib_types cache: %s', e)
+
+
+def get_type(key):
+    '''
+    Returns the BibType for a stable id, an untranslated type or a
+    translated name
+    '''
+    bib_type = TYPES_BY_ID.get(key) or TYPES_BY_TYPE.get(key)
+    if bib_type is None:
+        return ALL_TYPES[key]
+    return bib_type
+
+
+def _parse_items(items):
+    items = [tuple(item.strip().split(':')) for item in items.split('|')]
+    # Fix issue with URLs having a colon
+    return [(item[0], ':'.join(item[1:])) for item in items]
+
+
+class _LazyFormat(object):
+    # Builds the formatter the first time it is used, not at import
+
+    def __init__(self, factory, args):
+        self._factory = factory
+        self._args = args
+
+    def build(self):
+        return self._factory(*self._args)
+
+
+def _lazy(factory):
+    def wrapper(*args):
+        return _LazyFormat(factory, args)
+    return wrapper
 
 
 class BibType(object):
+    '''
+    A kind of bibliography entry.
 
-    def __init__(self, type, name, items, format_func,
+    Args:
+        id (str): short id that never changes, stored in entries and
+            sent to collaborators
+        type (str): untranslated name
+        name (str): translated name, shown to the user
+        items (str): the fields and their examples, see below
+        format_func: renders a list of escaped values as markup
+        web_title (int): index of the field for the title of a webpage
+        web_uri (int): index of the field for the URL of a webpage
+    '''
+
+    def __init__(self, id, type, name, items, format_func,
                  web_title=None, web_uri=None):
+        self.id = id
         self.type = type
-        self.name = name
-        self.format = format_func
+        self._format = format_func
         self.web_title_index = web_title
         self.web_uri_index = web_uri
 
-        items = [tuple(item.strip().split(':')) for item in items.split('|')]
-        # Fix issue with URLs having a colon
-        self.items = [(item[0], ':'.join(item[1:])) for item in items]
+        cached = _CATALOG.get(type)
+        if cached is not None:
+            self.name, self._items = cached
+        else:
+            self.name = gettext(name)
+            self._items = None
+        self._items_message = items
+        self._roles = None
 
         ALL_TYPES[self.name] = self
         ALL_TYPE_NAMES.append(self.name)
+        TYPES_BY_TYPE[self.type] = self
+        TYPES_BY_ID[self.id] = self
+
+    @property
+    def items(self):
+        if self._items is None:
+            self._items = _parse_items(gettext(self._items_message))
+        return self._items
+
+    @property
+    def labels(self):
+        '''
+        The untranslated label of each field
+        '''
+        return [label for label, example in
+                _parse_items(self._items_message)]
+
+    def field(self, role):
+        '''
+        Returns the index of the field that has the role (see
+        `FIELD_ROLES`), or None if this type has no such field
+        '''
+        if self._roles is None:
+            self._roles = {}
+            for i, label in enumerate(self.labels):
+                for name, labels in FIELD_ROLES.items():
+                    if label in labels:
+                        self._roles.setdefault(name, i)
+        return self._roles.get(role)
+
+    @property
+    def format(self):
+        if isinstance(self._format, _LazyFormat):
+            self._format = self._format.build()
+        return self._format
+
+
+class _Optional(object):
+    # A field that is left out, along with the text around it, if empty
+
+    def __init__(self, index, before, after):
+        self._index = index
+        self._before = before
+        self._after = after
+
+    def __call__(self, values):
+        value = values[self._index]
+        if value.strip():
+            return self._before + value + self._after
+        return ''
+
 
+class _Pages(object):
+    # Start and finish page, as "pp. 1-2" or just "p. 1"
+
+    def __init__(self, start, end):
+        self._start = start
+        self._end = end
+
+    def __call__(self, values):
+        start = values[self._start]
+        end = values[self._end]
+        if start.strip() == end.strip() or not end.strip():
+            return 'p. ' + start
+        return 'pp. ' + start + '-' + end
+
+
+class Template(object):
+    '''
+    A format string compiled once into its literal text and the slots
+    between it, so rendering an entry is only string concatenation.
+    Rendering never changes the values passed in.
+
+    Args:
+        format_string (str): string using `{}` for each slot
+        slots (list): for each `{}`, either the index of the value to
+            put there or a callable that takes the values and returns
+            the text.  Defaults to the values in order.
+    '''
+
+    def __init__(self, format_string, slots=None):
+        parsed = list(Formatter().parse(format_string))
+        self.fields = sum(1 for _, field, _, _ in parsed if field is not None)
+        if slots is None:
+            slots = range(self.fields)
+        slots = [itemgetter(s) if isinstance(s, int) else s for s in slots]
+
+        self._first = parsed[0][0]
+        self._parts = []
+        for i, slot in enumerate(slots):
+            literal = parsed[i + 1][0] if i + 1 < len(parsed) else ''
+            self._parts.append((slot, literal))
+
+    def __call__(self, values):
+        out = [self._first]
+        for slot, literal in self._parts:
+            out.append(slot(values))
+            out.append(literal)
+        return ''.join(out)
+
+
+@_lazy
 def basic_format(format_string):
-    def closure(values):
-        return format_string.format(*values)
-    return closure
+    return Template(format_string)
+
+
+_ESCAPES = [('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'),
+            ('\'', '&#39;'), ('"', '&quot;')]
+_CONTROL = re.compile(u'[\x01-\x08\x0b\x0c\x0e-\x1f\x7f-\x84\x86-\x9f]')
+
+
+def markup_escape(text):
+    '''
+    Escape text for use in Pango markup, like `GLib.markup_escape_text`
+    '''
+    for char, escape in _ESCAPES:
+        if char in text:
+            text = text.replace(char, escape)
+    return _CONTROL.sub(lambda m: '&#x{:x};'.format(ord(m.group())), text)
+
+
+class RenderCache(object):
+    '''
+    Least recently used cache of rendered markup.  The same entries get
+    rendered again and again (editing, exporting, collaborators sending
+    rows we already have), so keep the most recent ones.  Exports render
+    on a worker thread, so the cache is locked.
+
+    Args:
+        size (int): the most entries to keep
+    '''
+
+    def __init__(self, size=2048):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            markup = self._items.pop(key, None)
+            if markup is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items[key] = markup
+            return markup
+
+    def put(self, key, markup):
+        with self._lock:
+            self._items[key] = markup
+            self._evict()
+
+    def _evict(self):
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, size):
+        with self._lock:
+            self.size = size
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        return dict(size=self.size, items=len(self._items), hits=self.hits,
+                    misses=self.misses, evictions=self.evictions)
+
+
+RENDER_CACHE = RenderCache()
+_style = 'harvard'
+
+
+def reset_render_cache():
+    '''
+    Forget all rendered markup, eg. when the locale changes
+    '''
+    RENDER_CACHE.clear()
+
+
+def get_style():
+    return _style
+
+
+def set_style(style):
+    '''
+    Change the citation style used to render entries
+    '''
+    global _style
+    if style != _style:
+        _style = style
+        reset_render_cache()
+
+
+def _cache_key(bib_type, values):
+    return (bib_type.id, tuple(values), _style)
+
+
+def render(bib_type, values):
+    '''
+    Returns the markup for one entry of the type, escaping the values
+    '''
+    key = _cache_key(bib_type, values)
+    markup = RENDER_CACHE.get(key)
+    if markup is None:
+        markup = bib_type.format([markup_escape(v) for v in values])
+        RENDER_CACHE.put(key, markup)
+    return markup
+
+
+def render_many(records):
+    '''
+    Render lots of entries in one go.  Each distinct value is only
+    escaped once, and the records are grouped by type so that each
+    type's template is applied in one loop.
+
+    Args:
+        records: sequence of (BibType, values) pairs
+
+    Returns:
+        list of the markup for each record, in the same order
+    '''
+    records = list(records)
+    by_type = {}
+    for i, (bib_type, values) in enumerate(records):
+        by_type.setdefault(bib_type, []).append(i)
+
+    escaped = {}
+    out = [None] * len(records)
+    for bib_type, indexes in by_type.items():
+        format_ = bib_type.format
+        for i in indexes:
+            key = _cache_key(bib_type, records[i][1])
+            markup = RENDER_CACHE.get(key)
+            if markup is None:
+                values = []
+                for value in records[i][1]:
+                    e = escaped.get(value)
+                    if e is None:
+                        e = escaped[value] = markup_escape(value)
+                    values.append(e)
+                markup = format_(values)
+                RENDER_CACHE.put(key, markup)
+            out[i] = markup
+    return out
 
 # NOTE: To use the and symbol (`&`), you must type `&amp;`
 #       You also need to escape charecters like less than (`<` becomes `&lt;`)
@@ -58,38 +447,41 @@ def basic_format(format_string):
 # Books with more than 2 authors
 # CD recordings
 
-BibType('Book', _('Book'),
+BibType('bk', 'Book', _('Book'),
         _('Last Name:Shoup | First Name Initial:K | Year of Publication:2008 |'
           'Title:Reuse your refuse | Publisher:Wiley |'
           'Place of Publication:Hoboken, N.J'),
         basic_format('{}, {} {}, <i>{}</i>, {}, {}'))
-BibType('Book with 2 Authors', _('Book with 2 Authors'),
+BibType('bk2', 'Book with 2 Authors', _('Book with 2 Authors'),
         _('Author 1 Last Name:Fiell | Author 1 First Name Initial:C |'
           'Author 2 Last Name:Fiell | Author 2 First Name Initial:P |'
           'Year of Publication:2005 | Title:Graphic design now |'
           'Publisher:Taschen | Place of Publication:London'),
         basic_format('{}, {} &amp; {}, {} {}, <i>{}</i>, {}, {}'))
-BibType('Book without Author', _('Book without Author'),
+BibType('bkn', 'Book without Author', _('Book without Author'),
         _('Title:Rome | Year of Publication:2008 |'
           'Publisher:Dorling Kindersley | Place of Publication:London'),
         basic_format('<i>{}</i> {}, {}, {}'))
-BibType('Book with Editor', _('Book with Editor'),
+BibType('bke', 'Book with Editor', _('Book with Editor'),
         _('Editor Last Name:West | Editor First Name Initial:S |'
           'Year of Publication:2005 | Title:Guide to art |'
           'Publisher:Bloomsbury | Place of Publication:London'),
         basic_format('{}, {} (ed.) {}, <i>{}</i>, {}, {}'))
 
 
+@_lazy
 def ebook_format(without_edition, with_edition, index):
+    with_ = Template(with_edition)
+    without = Template(without_edition,
+                       [i for i in range(with_.fields) if i != index])
+
     def closure(values):
         if values[index].strip():
-            return with_edition.format(*values)
-        else:
-            del values[index]
-            return without_edition.format(*values)
+            return with_(values)
+        return without(values)
     return closure
 
-BibType('eBook', _('eBook'),
+BibType('eb', 'eBook', _('eBook'),
         _('Last Name:Sachar | First Name Initial:L |'
           'Year of Publication:2010 | Edition (if applicable): | Title:Holes |'
           'Publisher:Bloomsbury Publishing | Place of Publication:London |'
@@ -98,7 +490,7 @@ BibType('eBook', _('eBook'),
         ebook_format('{}, {} {}, <i>{}</i>, {}, {}, accessed {}, &lt;{}&gt;',
             '{}, {} {}, {} edn, <i>{}</i>, {}, {}, accessed {}, &lt;{}&gt;',
             3))
-BibType('eBook with 2 Authors', _('eBook with 2 Authors'),
+BibType('eb2', 'eBook with 2 Authors', _('eBook with 2 Authors'),
         _('Author 1 Last Name:Sharpley | Author 1 First Name Initial:R |'
           'Author 2 Last Name:Telfer | Author 2 First Name Initial:D |'
           'Year of Publication:2002 | Edition (if applicable): | '
@@ -111,7 +503,7 @@ BibType('eBook with 2 Authors', _('eBook with 2 Authors'),
                      '{}, {} &amp; {}, {} {}, {} edn, <i>{}</i>, {}, {}, '
                      'accessed {}, &lt;{}&gt;',
                      5))
-BibType('eBook without Author', _('eBook without Author'),
+BibType('ebn', 'eBook without Author', _('eBook without Author'),
         _('Title: You\'ve got what? | Year of Publication:2009 |'
           'Edition (if applicable):4th |'
           'Publisher:Communicable Disease Control Branch, Department of Health'
@@ -122,13 +514,13 @@ BibType('eBook without Author', _('eBook without Author'),
             '<i>{}</i> {}, {} edn, {}, {}, accessed {}, &lt;{}&gt;',
             2))
 
-BibType('Electronic Encyclopedia', _('Electronic Encyclopedia'),
+BibType('ence', 'Electronic Encyclopedia', _('Electronic Encyclopedia'),
         _('Title of Article:Earthquake | Year of Publication:2013 |'
           'Title of Encyclopedia:Encyclopaedia Britannica |'
           'Accessed:*datenow | URL:http://www.school.eb.com.au/all/comptons/'
           'article-9274104?query=earthquake'),
         basic_format('\'{}\' {}, in <i>{}</i>, accessed {}, &lt;{}&gt;'))
-BibType('Printed Encyclopedia with Author',
+BibType('encp', 'Printed Encyclopedia with Author',
         _('Printed Encyclopedia with Author'),
         _('Last Name:Pettus | First Name Initial:A M |'
           'Year of Publication:1998 | Title of Article:Edward Jenne |'
@@ -138,7 +530,7 @@ BibType('Printed Encyclopedia with Author',
           'Starting Page:691 | Finishing Page:693'),
         basic_format('{}, {} {}, \'{}\' in <i>{}</i>, {}, {} '
                      'vol. {}, pp. {}-{}'))
-BibType('Printed Encyclopedia without Author',
+BibType('encpn', 'Printed Encyclopedia without Author',
         _('Printed Encyclopedia without Author'),
         _('Title of Article:Germany | Year of Publication:2008 |'
           'Title of Encyclopedia:The World Book | Publisher:World Book |'
@@ -146,18 +538,16 @@ BibType('Printed Encyclopedia without Author',
           'Starting Page:146 | Finishing Page:172'),
         basic_format('\'{}\' {} in <i>{}</i>, {}, {} vol. {}, pp. {}-{}'))
 
+@_lazy
 def vid_format(string, volumei, issuei, datei):
-    def closure(values):
-        volume = ' vol. {},'.format(values[volumei]) \
-            if values[volumei].strip() else ''
-        issue = ' no. {},'.format(values[issuei]) \
-            if values[issuei].strip() else ''
-        date = ' {},'.format(values[datei]) if values[datei].strip() else ''
-        fvalues = values[:volumei] + [volume, issue, date] + values[datei + 1:]
-        return string.format(*fvalues)
-    return closure
+    optional = {volumei: _Optional(volumei, ' vol. ', ','),
+                issuei: _Optional(issuei, ' no. ', ','),
+                datei: _Optional(datei, ' ', ',')}
+    template = Template(string)
+    return Template(string, [optional.get(i, i)
+                             for i in range(template.fields)])
 
-BibType('Magazine or Journal Article with Author',
+BibType('mag', 'Magazine or Journal Article with Author',
         _('Magazine or Journal Article with Author'),
         _('Last Name:Carter | First Name Initial:R |'
           'Year of Publication:2014 |'
@@ -167,16 +557,16 @@ BibType('Magazine or Journal Article with Author',
           'Date of Issue (if applicable):August | Starting Page:37 |'
           'Finishing Page:43'),
         vid_format('{}, {} {} \'{}\', <i>{}</i>,{}{}{} pp. {}-{}', 5, 6, 7))
-BibType('Magazine or Journal Article without Author',
+BibType('magn', 'Magazine or Journal Article without Author',
         _('Magazine or Journal Article without Author'),
         _('Tite of Article:Appliances of Science | Year of Publication:2014 |'
           'Title of Magazine:BBC Focus | Volume (if applicable): |'
           'Issue (if applicable):271 |'
           'Date of Issue (if applicable):August | Starting Page:87 |'
           'Finishing Page:87'),
-        vid_format('{}, {} {} \'{}\', <i>{}</i>,{}{}{} pp. {}-{}', 3, 4, 5))
+        vid_format('\'{}\', {}, <i>{}</i>,{}{}{} pp. {}-{}', 3, 4, 5))
 
-BibType('Online Magazine or Journal Article with Author',
+BibType('omag', 'Online Magazine or Journal Article with Author',
         _('Online Magazine or Journal Article with Author'),
         _('Last Name:Keneley | First Name Initial:M |'
           'Year of Publication:2004 | Tite of Article:The dying town syndrome:'
@@ -188,29 +578,26 @@ BibType('Online Magazine or Journal Article with Author',
           'URL:ttp://www.jcu.edu.au/aff/history/articles/keneley3.htm'),
         vid_format('{}, {} {} \'{}\', <i>{}</i>,{}{}{}'
                    ' accessed {}, &lt;{}&gt;', 5, 6, 7))
-BibType('Online Magazine or Journal Article without Author',
+BibType('omagn', 'Online Magazine or Journal Article without Author',
         _('Online Magazine or Journal Article without Author'),
         _('Tite of Article:Logging off? | Year of Publication:2010 |'
           'Title of Magazine:New Internationalist | Volume (if applicable): |'
           'Issue (if applicable):432 | Date of Issue (if applicable):May |'
           'Accessed:*datenow | URL:http://www.newint.org/columns/currents/2010'
           '/05/01/illegal-logging-madagascar'),
-        vid_format('\'{}\', {} <i>{}</i>,{}{}{} pp. {}-{},'
+        vid_format('\'{}\', {}, <i>{}</i>,{}{}{}'
                    ' accessed {}, &lt;{}&gt;', 3, 4, 5))
 
+@_lazy
 def page_format(string, starti, endi):
-    def closure(values):
-        page = 'pp. {}-{}'.format(values[starti], values[endi])
-        if values[starti].strip() == values[endi].strip() \
-           or not values[endi].strip():
-            page = 'p. {}'.format(values[starti])
-
-        values[starti] = page
-        del values[endi]
-        return string.format(*values)
-    return closure
+    # Both pages go in the start page's slot, so the slots from the end
+    # page onwards take the value after
+    template = Template(string)
+    slots = [i if i < endi else i + 1 for i in range(template.fields)]
+    slots[starti] = _Pages(starti, endi)
+    return Template(string, slots)
 
-BibType('Newsaper Article with Author',
+BibType('np', 'Newsaper Article with Author',
         _('Newsaper Article with Author'),
         _('Last Name:Bourke | First Name Initial:L |'
           'Year of Publication:2014 |'
@@ -219,7 +606,7 @@ BibType('Newsaper Article with Author',
           'Date of Issue:27 December | Starting Page:1 |'
           'Finishing Page:'),
         page_format('{}, {} {} \'{}\', <i>{}</i>, {}, {}', 6, 7))
-BibType('Newsaper Article without Author',
+BibType('npn', 'Newsaper Article without Author',
         _('Newsaper Article without Author'),
         _('Title of Article:Aspirin put to the test | Year of Publication:2005 |'
           'Title of Newspaper:Advertiser |'
@@ -227,7 +614,7 @@ BibType('Newsaper Article without Author',
           'Finishing Page:'),
         page_format('\'{}\', {}, <i>{}</i>, {}, {}', 4, 5))
 
-BibType('Online Newsaper Article with Author',
+BibType('onp', 'Online Newsaper Article with Author',
         _('Online Newsaper Article with Author'),
         _('Last Name:Bourke | First Name Initial:L |'
           'Year of Publication:2014 | Title of Article:AirAsia QZ8501: '
@@ -239,7 +626,7 @@ BibType('Online Newsaper Article with Author',
           '20141229-12exkr.html'),
         basic_format('{}, {} {} \'{}\', <i>{}</i>, {},'
                      ' accessed {}, &lt;{}&gt;'))
-BibType('Online Article without Author',
+BibType('onpn', 'Online Article without Author',
         _('Online Article without Author'),
         _('Title of Article:Google street view broke privacy law |'
           'Year of Publication:2010 |Title of Newspaper:Advertiser |'
@@ -248,16 +635,15 @@ BibType('Online Article without Author',
           'privacy-law/story-e6frea8c-1225890011209'),
         basic_format('\'{}\', {}, <i>{}</i>, {}, accessed {}, &lt;{}&gt;'))
 
+@_lazy
 def license_format(string, index=-1):
-    def closure(values):
-        license = ', License: &lt;{}&gt;'.format(values[index]) \
-                  if values[index].strip() else ''
-        values[index] = license
-        return string.format(*values)
-    return closure
+    template = Template(string)
+    slots = list(range(template.fields))
+    slots[index] = _Optional(slots[index], ', License: &lt;', '&gt;')
+    return Template(string, slots)
 
 WEB_TYPES.extend([ \
-    BibType('Image with Creator (Real Name)',
+    BibType('img', 'Image with Creator (Real Name)',
             _('Image with Creator (Real Name)'),
             _('Last Name:Ganguly | First Name Initial:B | Year Created:2010 |'
               'Title or Description:Chicken Egg without Eggshell | Format:Photo |'
@@ -269,7 +655,7 @@ WEB_TYPES.extend([ \
             license_format('{}, {} {}, <i>{}</i>, {}, {},'
                            ' accessed {}, &lt;{}&gt;{}'),
             web_title=3, web_uri=7),
-    BibType('Image with Creator (Screen Name)',
+    BibType('imgs', 'Image with Creator (Screen Name)',
             _('Image with Creator (Screen Name)'),
             _('Screen Name or User Name:Dschwen | Year Created:2009 |'
               'Title or Description:Looking north from Chicago \'L\' station |'
@@ -279,7 +665,7 @@ WEB_TYPES.extend([ \
               'org/licenses/by-sa/4.0/deed.en'),
             license_format('{} {}, <i>{}</i>, {}, {}, accessed {}, &lt;{}&gt;{}'),
             web_title=2, web_uri=6),
-    BibType('Image without Creator', _('Image without Creator'),
+    BibType('imgn', 'Image without Creator', _('Image without Creator'),
             _('Title or Description:OLPC XO Laptop with Screen Twisted |'
               'Year Created:n.d. | Format:Photo |'
               'Sponsor or Orginisation:One Laptop Per Child |'
@@ -287,21 +673,21 @@ WEB_TYPES.extend([ \
               'hardware-left-side-view.png | License URL (if available):'),
             license_format('<i>{}</i> {}, {}, {}, accessed {}, &lt;{}&gt;{}'),
             web_title=0, web_uri=5),
-    BibType('Website with Author', _('Website with Author'),
+    BibType('web', 'Website with Author', _('Website with Author'),
             _('Last Name:Lesinski | First Name Initial:K | Last Update:2014 |'
               'Title of Webpage:MozJPEG 3.0 |'
               'Sponsor or Orginisation:Performance Calendar | Accessed:*datenow |'
               'URL:http://calendar.perfplanet.com/2014/mozjpeg-3-0/'),
             basic_format('{}, {} {}, <i>{}</i>, {}, accessed {}, &lt;{}&gt;'),
             web_title=3, web_uri=6),
-    BibType('Website by Organisation', _('Website by Organisation'),
+    BibType('webo', 'Website by Organisation', _('Website by Organisation'),
             _('Name of Organisation:Sugar Labs | Last Update:2010 |'
               'Title of Webpage:Sugar Labs-learning software for children |'
               'Sponsor or Orginisation:Sugar Labs |'
               'Accessed:*datenow | URL:http://sugarlabs.org/'),
             basic_format('{} {}, <i>{}</i>, {}, accessed {}, &lt;{}&gt;'),
             web_title=2, web_uri=5),
-    BibType('Website without Author', _('Website without Author'),
+    BibType('webn', 'Website without Author', _('Website without Author'),
             _('Title of Webpage:Avocado Jackpot | Year Created:2014 |'
               'Sponsor or Orginisation:Reddit | Accessed:*datenow |'
               'URL:http://www.reddit.com/r/food/comments/2qnbpc/avocado_jackpot/'),
@@ -309,25 +695,26 @@ WEB_TYPES.extend([ \
             web_title=0, web_uri=4) \
 ])
 
+@_lazy
 def place_format(string, index):
-    def closure(values):
-        place = ', {}'.format(values[index]) if values[index].strip() else ''
-        values[index] = place
-        return string.format(*values)
-    return closure
+    template = Template(string)
+    slots = list(range(template.fields))
+    slots[index] = _Optional(index, ', ', '')
+    return Template(string, slots)
 
-BibType('Film', _('Film'),
+BibType('film', 'Film', _('Film'),
         _('Title:Toy Story 2 | Year Created:1999 | Format:DVD |'
           'Distributor:Buena Vista Home Entertainment |'
           'Place (if available): | Special Credits or Other Information: A '
           'Pixar Animation Studios Film'),
         place_format('<i>{}</i> {}, {}, {}{}. {}', 4))
-BibType('Television Program (Single)', _('Television Program (Single)'),
+BibType('tv', 'Television Program (Single)',
+        _('Television Program (Single)'),
         _('Title:Ten Bucks A Liter | Year of Broadcast:2013 | Format:iview |'
           'Television Channel:ABC | Place (if available): |'
           'Date of Broadcast:1 August'),
         place_format('<i>{}</i> {}, {}, {}{}, {}', 4))
-BibType('Television Program (Part of Series)',
+BibType('tvs', 'Television Program (Part of Series)',
         _('Television Program (Part of Series)'),
         _('Episode Title:Radio Goodies | Year of Broadcast:1970 |'
           'Series Title: The Goodies | Format:DVD |'
@@ -34,7 +34,7 @@ from sugar3.datastore import datastore
 from popwindow import PopWindow
 
 from add_window import EntryWidget
-from bib_types import WEB_TYPES, ALL_TYPES
+from bib_types import WEB_TYPES, TYPES_BY_ID
 
 
 HELP_TEXT = _( \
@@ -51,22 +51,23 @@ class BrowseImportWindow(PopWindow):
     A window that let's users import items from a browse activity
 
     Args:
-        data (dict): JSON decoded browse activity data
+        links (list): the `shared_links` (bookmarks) from the browse
+            activity data
         toplevel (Gtk.Window): toplevel window
         jobject: jobject from object chooser
     '''
 
-    save_item = GObject.Signal('save-item', arg_types=[str, str, str])
+    save_item = GObject.Signal('save-item', arg_types=[object])
     try_again = GObject.Signal('try-again', arg_types=[object])
 
-    def __init__(self, data, toplevel, jobject):
+    def __init__(self, links, toplevel, jobject):
         PopWindow.__init__(self, transient_for=toplevel)
         self.props.size = PopWindow.FULLSCREEN
         w, h = PopWindow.FULLSCREEN
         self._toplevel = toplevel
         self._jobject = jobject
 
-        self._links = data.get('shared_links', [])
+        self._links = links
         if not self._links:
             self._show_howto_copy()
             return
@@ -89,7 +90,7 @@ class BrowseImportWindow(PopWindow):
 
         self._combo = Gtk.ComboBoxText()
         for t in WEB_TYPES:
-            self._combo.append(t.type, t.name)
+            self._combo.append(t.id, t.name)
         self._combo.set_active(0)
         self._combo.connect('changed', self.__combo_changed_cb)
         self._2box.add(self._combo)
@@ -153,7 +154,7 @@ class BrowseImportWindow(PopWindow):
         self._webview.load_uri(self._link.get('url'))
 
         id_ = self._combo.get_active_id()
-        bib_type = ALL_TYPES[id_]
+        bib_type = TYPES_BY_ID[id_]
         self._set_entry(bib_type)
 
     def _set_entry(self, type_):
@@ -172,10 +173,10 @@ class BrowseImportWindow(PopWindow):
         self._entry.show()
 
     def __add_clicked_cb(self, button):
-        self.save_item.emit( *self._entry.get_data())
+        self.save_item.emit(self._entry.get_data())
         self.next_link()
 
     def __combo_changed_cb(self, combo):
         id_ = combo.get_active_id()
-        bib_type = ALL_TYPES[id_]
+        bib_type = TYPES_BY_ID[id_]
         self._set_entry(bib_type)
@@ -0,0 +1,267 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+'''
+Finds entries that are probably copies of each other, even if they
+differ by whitespace, case, the URL's scheme or trailing slash, or the
+date they were accessed.
+
+Each entry gets a MinHash signature of the character shingles of its
+normalised values.  The signature is split into bands, and only entries
+that share a band are compared, so finding the copies of an entry
+doesn't mean comparing it with every other entry.
+'''
+
+import re
+import zlib
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+# Fields that say when the entry was made, not what it is about
+IGNORED_LABELS = frozenset(['Accessed'])
+URL_LABELS = frozenset(['URL'])
+
+SHINGLE_SIZE = 4
+BANDS = 8
+ROWS = 4
+# Entries with an estimated Jaccard similarity above this are copies
+THRESHOLD = 0.8
+
+_EMPTY = 1 << 32
+_URL_SCHEME = re.compile(r'^[a-z]+://(www\.)?')
+
+# BibType id -> (indexes of fields to use, indexes of URL fields)
+_fields = {}
+
+
+def _type_fields(bib_type):
+    fields = _fields.get(bib_type.id)
+    if fields is None:
+        labels = bib_type.labels
+        used = [i for i, label in enumerate(labels)
+                if label not in IGNORED_LABELS]
+        urls = set(i for i, label in enumerate(labels)
+                   if label in URL_LABELS or i == bib_type.web_uri_index)
+        fields = _fields[bib_type.id] = (used, urls)
+    return fields
+
+
+def normalize(entry):
+    '''
+    Returns the text of the entry that is compared with other entries
+    '''
+    used, urls = _type_fields(entry.bib_type)
+    parts = []
+    for i in used:
+        if i >= len(entry.values):
+            break
+        value = unicodedata.normalize('NFKC', entry.values[i])
+        value = ' '.join(value.lower().split())
+        if i in urls:
+            value = _URL_SCHEME.sub('', value).rstrip('/')
+        if value:
+            parts.append(value)
+    return u'\x1f'.join(parts)
+
+
+def signature(text):
+    '''
+    Returns the MinHash signature of the shingles of the text, as an
+    array of 32 bit values.
+
+    Rather than hashing every shingle once for each part of the
+    signature, each shingle is hashed once and goes in one of the parts
+    (one permutation hashing).  Parts that no shingle went in take the
+    value of the next part that has one, so short texts still compare.
+    '''
+    size = BANDS * ROWS
+    parts = [_EMPTY] * size
+    for i in range(max(len(text) - SHINGLE_SIZE + 1, 1)):
+        h = (zlib.crc32(text[i:i + SHINGLE_SIZE].encode('utf-8'))
+             * 0x9e3779b1) & 0xffffffff
+        part = h % size
+        if h < parts[part]:
+            parts[part] = h
+
+    filled = [i for i, h in enumerate(parts) if h != _EMPTY]
+    if len(filled) < size and filled:
+        for i in range(size):
+            if parts[i] == _EMPTY:
+                # Distance to the next filled part keeps borrowed values
+                # apart from the part's own values
+                j = filled[bisect_left(filled, i) % len(filled)]
+                parts[i] = ((j - i) % size * 0x85ebca6b
+                            + parts[j]) & 0xffffffff
+    return array('L', parts)
+
+
+def entry_fingerprint(entry):
+    '''
+    Returns a hash of the normalised text and the signature of an
+    entry, which only depend on the entry so can be made on any thread
+    '''
+    text = normalize(entry)
+    return hash(text), signature(text)
+
+
+def similarity(a, b):
+    '''
+    Estimates the Jaccard similarity of the shingles from two signatures
+    '''
+    return sum(x == y for x, y in zip(a, b)) / float(len(a))
+
+
+class DuplicateIndex(object):
+    '''
+    Keeps the signatures of the entries in the list, bucketed by band.
+
+    Most buckets only ever hold one entry, so a bucket is the entry's
+    id until a second one arrives, and only then a set of ids.
+    '''
+
+    def __init__(self):
+        self._text_hashes = {}
+        self._signatures = {}
+        # Hash of normalised text -> ids, for copies that normalise the same
+        self._exact = {}
+        # Hash of band and part of signature -> ids
+        self._buckets = {}
+
+    def __contains__(self, id_):
+        return id_ in self._signatures
+
+    def _bands(self, sig):
+        for band in range(BANDS):
+            yield hash((band,) + tuple(sig[band * ROWS:(band + 1) * ROWS]))
+
+    def _put(self, buckets, key, id_):
+        ids = buckets.get(key)
+        if ids is None:
+            buckets[key] = id_
+        elif isinstance(ids, set):
+            ids.add(id_)
+        elif ids != id_:
+            buckets[key] = set((ids, id_))
+
+    def _ids(self, buckets, key):
+        ids = buckets[key]
+        return ids if isinstance(ids, set) else (ids,)
+
+    def add(self, id_, entry, fingerprint=None):
+        '''
+        Add an entry.  `fingerprint` can be given if the result of
+        `entry_fingerprint` for the entry is already known.
+        '''
+        if fingerprint is None:
+            fingerprint = entry_fingerprint(entry)
+        text_hash, sig = fingerprint
+        self._text_hashes[id_] = text_hash
+        self._signatures[id_] = sig
+        self._put(self._exact, text_hash, id_)
+        for key in self._bands(sig):
+            self._put(self._buckets, key, id_)
+
+    def remove(self, id_):
+        sig = self._signatures.pop(id_, None)
+        if sig is None:
+            return
+        text_hash = self._text_hashes.pop(id_)
+        self._discard(self._exact, text_hash, id_)
+        for key in self._bands(sig):
+            self._discard(self._buckets, key, id_)
+
+    def _discard(self, buckets, key, id_):
+        ids = buckets[key]
+        if not isinstance(ids, set):
+            if ids == id_:
+                del buckets[key]
+            return
+        ids.discard(id_)
+        if len(ids) == 1:
+            buckets[key] = ids.pop()
+
+    def update(self, id_, entry):
+        self.remove(id_)
+        self.add(id_, entry)
+
+    def duplicates_of(self, id_):
+        '''
+        Returns the ids of the entries that look like copies of the
+        entry with the id, most similar first
+        '''
+        sig = self._signatures.get(id_)
+        if sig is None:
+            return []
+
+        found = dict((other, 1.0) for other
+                     in self._ids(self._exact, self._text_hashes[id_]))
+        candidates = set()
+        for key in self._bands(sig):
+            candidates.update(self._ids(self._buckets, key))
+        for other in candidates - set(found):
+            score = similarity(sig, self._signatures[other])
+            if score >= THRESHOLD:
+                found[other] = score
+
+        found.pop(id_, None)
+        return sorted(found, key=found.get, reverse=True)
+
+    def groups(self):
+        '''
+        Returns a list of the groups of ids of entries that look like
+        copies of each other.  Only groups of more than one are returned.
+        '''
+        parent = {}
+
+        def find(id_):
+            root = id_
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while id_ != root:
+                parent[id_], id_ = root, parent[id_]
+            return root
+
+        def union(a, b):
+            a, b = find(a), find(b)
+            if a != b:
+                parent[b] = a
+
+        for ids in self._exact.values():
+            if not isinstance(ids, set):
+                continue
+            first = next(iter(ids))
+            for other in ids:
+                union(first, other)
+
+        compared = set()
+        for ids in self._buckets.values():
+            if not isinstance(ids, set):
+                continue
+            ids = sorted(ids)
+            for i, a in enumerate(ids):
+                for b in ids[i + 1:]:
+                    if (a, b) in compared or find(a) == find(b):
+                        continue
+                    compared.add((a, b))
+                    if similarity(self._signatures[a],
+                                  self._signatures[b]) >= THRESHOLD:
+                        union(a, b)
+
+        groups = {}
+        for id_ in self._signatures:
+            groups.setdefault(find(id_), []).append(id_)
+        return [ids for ids in groups.values() if len(ids) > 1]
@@ -0,0 +1,137 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import sys
+import json
+import uuid
+import hashlib
+
+from bib_types import TYPES_BY_ID, get_type, render, render_many
+
+
+class StringPool(object):
+    '''
+    Shares one copy of each string between all the entries.  Publishers,
+    places, dates and so on repeat across lots of entries, but each
+    entry made from a file or a message has its own copy of them.
+    '''
+
+    def __init__(self):
+        self._strings = {}
+        self.hits = 0
+        self.saved_bytes = 0
+
+    def __len__(self):
+        return len(self._strings)
+
+    def intern(self, value):
+        # Gtk gives us utf-8 byte strings on Python 2, but json gives unicode
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        shared = self._strings.setdefault(value, value)
+        if shared is not value:
+            self.hits += 1
+            self.saved_bytes += sys.getsizeof(value)
+        return shared
+
+    def report(self):
+        '''
+        Returns a dict describing how much memory the pool saved
+        '''
+        return dict(
+            strings=len(self._strings),
+            pool_bytes=sum(sys.getsizeof(s) for s in self._strings),
+            hits=self.hits,
+            saved_bytes=self.saved_bytes)
+
+
+POOL = StringPool()
+_intern = POOL.intern
+
+
+def new_entry_id():
+    return uuid.uuid4().hex
+
+
+class Entry(object):
+    '''
+    A bibliography entry.  The type id and the field values are shared
+    between all the entries that use them.
+
+    Entries are never changed once made; editing an entry replaces it
+    with a new one that has the same id.
+
+    Args:
+        type_ (str): the type's stable id (`BibType.id`), or its name
+        values (list[str]): the value of each of the type's fields
+        id_ (str): id that stays the same between edits and
+            collaborators, a new one is made if not given
+    '''
+
+    __slots__ = ('id', 'type', 'values')
+
+    def __init__(self, type_, values, id_=None):
+        self.id = id_ or new_entry_id()
+        # The BibType's own copy of its id, so it is shared already
+        self.type = get_type(type_).id
+        self.values = tuple(_intern(v) for v in values)
+
+    @property
+    def bib_type(self):
+        return TYPES_BY_ID[self.type]
+
+    @property
+    def markup(self):
+        return render(self.bib_type, self.values)
+
+    def replace(self, other):
+        '''
+        Returns an entry with the type and values of `other`, but this
+        entry's id
+        '''
+        return Entry(other.type, other.values, self.id)
+
+    def to_json(self):
+        return [self.id, self.type, list(self.values)]
+
+    @classmethod
+    def from_json(cls, data):
+        '''
+        Make an entry from the result of `to_json`, or from a row saved
+        by older versions or sent by them to add or delete an entry:
+        `[markup, type, values as json]` with an optional id on the end.
+        Edits sent by older versions can't be matched to an entry.
+        '''
+        if len(data) == 3 and isinstance(data[2], list):
+            id_, type_, values = data
+            return cls(type_, values, id_)
+
+        markup, type_, values = data[:3]
+        if len(data) > 3:
+            id_ = data[3]
+        else:
+            # Every copy of the same old row gets the same id, so it is
+            # only added once when collaborators merge their lists
+            id_ = hashlib.md5(json.dumps(data[:3]).encode('utf-8')) \
+                .hexdigest()
+        return cls(type_, json.loads(values), id_)
+
+
+def render_entries(entries):
+    '''
+    Returns the markup for each of the entries, see `render_many`
+    '''
+    return render_many((entry.bib_type, entry.values) for entry in entries)
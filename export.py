@@ -0,0 +1,509 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+'''
+Exporting the bibliography as other kinds of document.
+
+A `DocumentFormat` turns each entry into a fragment of the document.
+`ExportJob` writes a document on a worker thread, so that big
+bibliographies don't freeze the activity while exporting, and reuses
+the fragments of entries that didn't change since the last export.
+'''
+
+import os
+import re
+import json
+import codecs
+import hashlib
+import logging
+import threading
+
+from gi.repository import GLib
+
+from bib_types import get_style
+import interchange
+from entry import render_entries
+from markup import translate, AbiWordBackend, HTMLBackend
+
+# Entries rendered at once, and between progress reports
+BATCH_SIZE = 200
+BUFFER_SIZE = 64 * 1024
+
+_NOT_WORD = re.compile(r'[^A-Za-z0-9]')
+
+
+class DocumentFormat(object):
+    '''
+    A kind of document.  Each entry becomes a fragment of the document,
+    and the fragments go between the header and footer.
+    '''
+
+    # Used to name the fragment cache
+    name = None
+    mime_type = None
+    separator = ''
+    # False if fragments are made from the entry alone
+    uses_markup = True
+
+    def header(self, title):
+        return ''
+
+    def fragment(self, entry, markup):
+        raise NotImplementedError
+
+    def footer(self):
+        return ''
+
+
+class HTMLFormat(DocumentFormat):
+
+    name = 'html'
+    mime_type = 'text/html'
+
+    def __init__(self):
+        self._backend = HTMLBackend()
+
+    def header(self, title):
+        return '''<html>
+                         <head>
+                           <title>{title}</title>
+                         </head>
+
+                         <body>
+                           <h1>{title}</h1>
+                    '''.format(title=title)
+
+    def fragment(self, entry, markup):
+        return translate(markup, self._backend)
+
+    def footer(self):
+        return '''
+                         </body>
+                       </html>
+                    '''
+
+
+class AbiWordFormat(DocumentFormat):
+
+    name = 'abiword'
+    mime_type = 'application/x-abiword'
+    separator = '\n<p><c></c></p>\n'
+
+    def __init__(self):
+        self._backend = AbiWordBackend()
+
+    def header(self, title):
+        return '<?xml version="1.0" encoding="UTF-8"?>\n<abiword>\n<section>'
+
+    def fragment(self, entry, markup):
+        return translate(markup, self._backend)
+
+    def footer(self):
+        return '</section>\n</abiword>'
+
+
+class BibTeXFormat(DocumentFormat):
+
+    name = 'bibtex'
+    mime_type = 'text/x-bibtex'
+    separator = '\n'
+    uses_markup = False
+
+    _SPECIAL = re.compile(r'[\\{}&%$#_~^]')
+    _AND = re.compile(r'\sand\s')
+    _REPLACEMENTS = {'\\': '\\textbackslash{}', '~': '\\textasciitilde{}',
+                     '^': '\\textasciicircum{}'}
+
+    def _escape(self, text):
+        return self._SPECIAL.sub(
+            lambda m: self._REPLACEMENTS.get(m.group(), '\\' + m.group()),
+            text)
+
+    def _names(self, fields, last, first):
+        # Braces keep an organisation, or a last name that has an "and"
+        # or a comma in it, as one name when read back
+        if last not in fields:
+            return []
+        name = self._escape(fields[last])
+        if first not in fields:
+            return [u'{' + name + u'}']
+        if ',' in name or self._AND.search(name) is not None:
+            name = u'{' + name + u'}'
+        return [name + u', ' + self._escape(fields[first])]
+
+    def _key(self, entry, fields):
+        name = fields.get(interchange.AUTHOR_LAST) or \
+            fields.get(interchange.TITLE, '')
+        key = u'{}{}'.format(name[:20], fields.get(interchange.YEAR, ''))
+        return _NOT_WORD.sub('', key) + entry.id[:6]
+
+    def fragment(self, entry, markup):
+        fields = interchange.entry_fields(entry)
+        entry_type = interchange.TYPE_CODES[entry.type][0]
+        container = {'article': 'journal',
+                     'incollection': 'booktitle'}.get(entry_type, 'series')
+
+        values = []
+        authors = self._names(fields, interchange.AUTHOR_LAST,
+                              interchange.AUTHOR_FIRST) + \
+            self._names(fields, interchange.AUTHOR2_LAST,
+                        interchange.AUTHOR2_FIRST)
+        if authors:
+            values.append(('author', ' and '.join(authors)))
+        editors = self._names(fields, interchange.EDITOR_LAST,
+                              interchange.EDITOR_FIRST)
+        if editors:
+            values.append(('editor', editors[0]))
+        for name, field in [
+                ('title', interchange.TITLE),
+                (container, interchange.CONTAINER),
+                ('publisher', interchange.PUBLISHER),
+                ('address', interchange.PLACE),
+                ('edition', interchange.EDITION),
+                ('volume', interchange.VOLUME),
+                ('number', interchange.ISSUE),
+                ('pages', None),
+                ('year', interchange.YEAR),
+                ('month', interchange.DATE),
+                ('howpublished', interchange.MEDIUM),
+                ('note', interchange.NOTE)]:
+            value = _pages(fields, '--') if name == 'pages' \
+                else fields.get(field)
+            if value:
+                values.append((name, self._escape(value)))
+        for name, field in [('url', interchange.URL),
+                            ('urldate', interchange.ACCESSED),
+                            ('license', interchange.LICENSE)]:
+            if field in fields:
+                # Only braces need escaping in urls
+                values.append((name, fields[field].replace('{', '\\{')
+                               .replace('}', '\\}')))
+
+        lines = ['@{}{{{},'.format(entry_type, self._key(entry, fields))]
+        lines.extend(u'  {} = {{{}}},'.format(name, value)
+                     for name, value in values)
+        lines.append('}\n')
+        return '\n'.join(lines)
+
+
+class RISFormat(DocumentFormat):
+
+    name = 'ris'
+    mime_type = 'application/x-research-info-systems'
+    uses_markup = False
+
+    _TAGS = [('TI', interchange.TITLE), ('T2', interchange.CONTAINER),
+             ('PY', interchange.YEAR), ('DA', interchange.DATE),
+             ('PB', interchange.PUBLISHER), ('CY', interchange.PLACE),
+             ('ET', interchange.EDITION), ('VL', interchange.VOLUME),
+             ('IS', interchange.ISSUE), ('SP', interchange.START_PAGE),
+             ('EP', interchange.END_PAGE), ('Y2', interchange.ACCESSED),
+             ('UR', interchange.URL), ('M3', interchange.MEDIUM),
+             ('N1', interchange.NOTE)]
+
+    def fragment(self, entry, markup):
+        fields = interchange.entry_fields(entry)
+        lines = [('TY', interchange.TYPE_CODES[entry.type][1])]
+        for last, first in [
+                (interchange.AUTHOR_LAST, interchange.AUTHOR_FIRST),
+                (interchange.AUTHOR2_LAST, interchange.AUTHOR2_FIRST)]:
+            lines.extend(('AU', name) for name in _names(fields, last, first))
+        lines.extend(('ED', name) for name in _names(
+            fields, interchange.EDITOR_LAST, interchange.EDITOR_FIRST))
+        for tag, field in self._TAGS:
+            if field in fields:
+                # Values can't go over more than one line
+                lines.append((tag, u' '.join(fields[field].split())))
+        lines.append(('ER', ''))
+        return u''.join(u'{}  - {}\r\n'.format(tag, value)
+                        for tag, value in lines)
+
+
+class CSVFormat(DocumentFormat):
+    '''
+    One row for each entry: the type id, then the `interchange.FIELDS`
+    '''
+
+    name = 'csv'
+    mime_type = 'text/csv'
+    uses_markup = False
+
+    def _row(self, values):
+        return u','.join(_csv_quote(value) for value in values) + '\r\n'
+
+    def header(self, title):
+        return self._row(['type'] + interchange.FIELDS)
+
+    def fragment(self, entry, markup):
+        fields = interchange.entry_fields(entry)
+        return self._row([entry.type] +
+                         [fields.get(name, '') for name in interchange.FIELDS])
+
+
+def _csv_quote(value):
+    if any(char in value for char in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def _names(fields, last, first):
+    # "Last, First" or just "Last", as a list of one or none
+    if last not in fields:
+        return []
+    if first in fields:
+        return [fields[last] + ', ' + fields[first]]
+    return [fields[last]]
+
+
+def _pages(fields, dash):
+    start = fields.get(interchange.START_PAGE)
+    end = fields.get(interchange.END_PAGE)
+    if start and end and start != end:
+        return start + dash + end
+    return start or end
+
+
+class FragmentCache(object):
+    '''
+    The fragments of a format from the last export, so exporting again
+    only renders the entries that were added or changed since.  Each
+    fragment is kept with a hash of its entry's type and values.
+
+    Args:
+        path (str): file to keep the fragments in between exports
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        # Held by the job using the cache
+        self.lock = threading.Lock()
+        # Entry id -> (hash, fragment), loaded when first needed
+        self._fragments = None
+        # Fragments used by the current export
+        self._used = {}
+        self._changed = False
+        # Entry id -> (Entry, hash), so unchanged entries aren't hashed
+        # again in the same session
+        self._hashes = {}
+
+    def _load(self):
+        self._fragments = {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if data.get('style') == get_style():
+            self._fragments = data['fragments']
+
+    def _hash(self, entry):
+        known = self._hashes.get(entry.id)
+        if known is not None and known[0] is entry:
+            return known[1]
+        text = u'\x1f'.join((entry.type,) + entry.values)
+        hash_ = hashlib.md5(text.encode('utf-8')).hexdigest()
+        self._hashes[entry.id] = (entry, hash_)
+        return hash_
+
+    def get(self, entry):
+        '''
+        Returns the fragment for the entry, or None if it changed
+        '''
+        if self._fragments is None:
+            self._load()
+        cached = self._fragments.get(entry.id)
+        if cached is None or cached[0] != self._hash(entry):
+            return None
+        self._used[entry.id] = cached
+        return cached[1]
+
+    def put(self, entry, fragment):
+        self._used[entry.id] = (self._hash(entry), fragment)
+        self._changed = True
+
+    def save(self):
+        '''
+        Save the fragments used by this export, forgetting the others
+        '''
+        # Entries can only be dropped if there are fewer of them
+        changed = self._changed or self._fragments is None or \
+            len(self._used) != len(self._fragments)
+        self._fragments, self._used = self._used, {}
+        self._changed = False
+        for id_ in set(self._hashes) - set(self._fragments):
+            del self._hashes[id_]
+        if not changed:
+            return
+        try:
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(dict(style=get_style(),
+                               fragments=self._fragments), f)
+            os.rename(self.path + '.tmp', self.path)
+        except (IOError, OSError) as e:
+            logging.error('Could not save the export cache: %s', e)
+
+    def discard(self):
+        '''
+        Forget the fragments used by an export that didn't finish
+        '''
+        self._used = {}
+        self._changed = False
+
+
+class ExportTarget(object):
+    '''
+    A document being written by an `ExportJob`
+
+    Args:
+        path (str): file to write
+        document_format (DocumentFormat): the kind of document to write
+        title (str): title of the document
+        cache (FragmentCache): fragments from the last export of this
+            format, or None
+    '''
+
+    def __init__(self, path, document_format, title, cache=None):
+        self.path = path
+        self.format = document_format
+        self.title = title
+        self.cache = cache
+
+    def fragments(self, batch, get_markups):
+        '''
+        Returns the fragments for a batch of entries.  `get_markups`
+        returns the markup of the entries at a list of indexes in the
+        batch, and is only called for the entries not in the cache.
+        '''
+        cache = self.cache
+        fragments = [None] * len(batch)
+        if cache is not None:
+            fragments = [cache.get(entry) for entry in batch]
+        missing = [i for i, fragment in enumerate(fragments)
+                   if fragment is None]
+        if not missing:
+            return fragments
+
+        document_format = self.format
+        if document_format.uses_markup:
+            markups = get_markups(missing)
+        else:
+            markups = [None] * len(missing)
+        for i, markup in zip(missing, markups):
+            fragments[i] = document_format.fragment(batch[i], markup)
+            if cache is not None:
+                cache.put(batch[i], fragments[i])
+        return fragments
+
+
+class ExportJob(object):
+    '''
+    Writes documents for some entries on a worker thread.  The entries
+    are read once, in batches, and each batch goes to every document,
+    so exporting to several formats doesn't walk the list for each.
+    Each entry is only rendered once for all the documents, and only if
+    some document needs its markup and doesn't have it cached.
+
+    The callbacks are called from the main loop.
+
+    Args:
+        entries (list[Entry]): the entries to export.  Entries are never
+            changed, so a list of them is a snapshot of the bibliography.
+        targets (list[ExportTarget]): the documents to write
+        progress_cb (callable): called with the job and the number of
+            entries done
+        done_cb (callable): called with the job when it has finished,
+            been cancelled (`cancelled`) or failed (`error`)
+    '''
+
+    def __init__(self, entries, targets, progress_cb, done_cb):
+        self.targets = targets
+        self.total = len(entries)
+        self.cancelled = False
+        self.error = None
+        self._entries = entries
+        self._progress_cb = progress_cb
+        self._done_cb = done_cb
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _write(self, files):
+        for target, f in zip(self.targets, files):
+            f.write(target.format.header(target.title))
+
+        entries = self._entries
+        for start in range(0, len(entries), BATCH_SIZE):
+            if self.cancelled:
+                return
+            batch = entries[start:start + BATCH_SIZE]
+            # Index in the batch -> markup, shared by the documents
+            markups = {}
+
+            def get_markups(indexes):
+                new = [i for i in indexes if i not in markups]
+                if new:
+                    markups.update(zip(new, render_entries(
+                        [batch[i] for i in new])))
+                return [markups[i] for i in indexes]
+
+            for target, f in zip(self.targets, files):
+                fragments = target.fragments(batch, get_markups)
+                separator = target.format.separator
+                if start == 0:
+                    f.write(fragments[0])
+                    fragments = fragments[1:]
+                for fragment in fragments:
+                    f.write(separator + fragment)
+
+            done = min(start + BATCH_SIZE, self.total)
+            GLib.idle_add(self._progress_cb, self, done)
+
+        for target, f in zip(self.targets, files):
+            f.write(target.format.footer())
+
+    def _run(self):
+        # Locked in the same order by every job, so jobs sharing caches
+        # can't wait for each other
+        caches = sorted(set(target.cache for target in self.targets
+                            if target.cache is not None),
+                        key=lambda cache: cache.path)
+        for cache in caches:
+            cache.lock.acquire()
+        files = []
+        try:
+            for target in self.targets:
+                files.append(codecs.open(target.path, 'w', 'utf-8',
+                                         buffering=BUFFER_SIZE))
+            self._write(files)
+        except Exception as e:
+            logging.exception('Exporting failed')
+            self.error = e
+        finally:
+            for f in files:
+                f.close()
+
+        for cache in caches:
+            if self.cancelled or self.error is not None:
+                cache.discard()
+            else:
+                cache.save()
+            cache.lock.release()
+        GLib.idle_add(self._done_cb, self)
@@ -0,0 +1,77 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+from gi.repository import Gtk
+from gi.repository import GObject
+
+from gettext import gettext as _
+
+from sugar3.graphics.toolbutton import ToolButton
+from sugar3.graphics.palettemenu import PaletteMenuBox
+from sugar3.graphics.palettemenu import PaletteMenuItem
+
+from export import HTMLFormat, AbiWordFormat, BibTeXFormat, RISFormat
+from export import CSVFormat
+
+
+class ExportToolButton(ToolButton):
+    '''
+    Lets the user pick several formats to save the bibliography as at
+    once.  The `export` signal gives a list of `DocumentFormat`s.
+    '''
+
+    __gsignals__ = {
+        'export': (GObject.SIGNAL_RUN_FIRST, None, (object,))
+    }
+
+    def __init__(self):
+        ToolButton.__init__(self, 'document-save')
+        self.set_tooltip(_('Save in Several Formats'))
+        self.palette_invoker.props.toggle_palette = True
+
+        box = PaletteMenuBox()
+        self.get_palette().set_content(box)
+        box.show()
+
+        self._checks = []
+        for format_class, name in [
+                (HTMLFormat, _('HTML')),
+                (AbiWordFormat, _('Write document')),
+                (BibTeXFormat, _('BibTeX')),
+                (RISFormat, _('RIS')),
+                (CSVFormat, _('CSV'))]:
+            check = Gtk.CheckButton(label=name)
+            check.props.active = True
+            check.connect('toggled', self.__toggled_cb)
+            box.append_item(check)
+            check.show()
+            self._checks.append((check, format_class))
+
+        box.append_separator()
+
+        self._export_item = PaletteMenuItem(_('Save'),
+                                            icon_name='document-save')
+        self._export_item.connect('activate', self.__export_activate_cb)
+        box.append_item(self._export_item)
+        self._export_item.show()
+
+    def __toggled_cb(self, button):
+        self._export_item.set_sensitive(
+            any(check.props.active for check, format_class in self._checks))
+
+    def __export_activate_cb(self, menu_item):
+        self.emit('export', [format_class() for check, format_class
+                             in self._checks if check.props.active])
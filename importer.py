@@ -0,0 +1,849 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+'''
+Importing entries from BibTeX, RIS and CSV files.
+
+The parsers read the file one record at a time, so big files are never
+held in memory as a whole.  Each record becomes a `Record` of common
+fields (see `interchange`), and is turned into an entry of the type
+that fits it best.  `ImportJob` does all of that on a worker thread.
+'''
+
+import io
+import re
+import csv
+import sys
+import logging
+import threading
+import unicodedata
+
+from gi.repository import GLib
+
+import interchange
+from bib_types import TYPES_BY_ID
+from entry import Entry, render_entries
+from search import entry_words
+from duplicates import entry_fingerprint
+
+# Entries rendered at once, and between progress reports
+BATCH_SIZE = 200
+
+BIBTEX = 'bibtex'
+RIS = 'ris'
+CSV = 'csv'
+
+MIME_TYPES = {
+    'text/x-bibtex': BIBTEX,
+    'application/x-bibtex': BIBTEX,
+    'application/x-research-info-systems': RIS,
+    'text/csv': CSV,
+    'text/comma-separated-values': CSV,
+}
+
+# Kinds of record, each is one or more BibTypes
+BOOK = 'book'
+ENCYCLOPEDIA = 'encyclopedia'
+MAGAZINE = 'magazine'
+NEWSPAPER = 'newspaper'
+WEB = 'web'
+IMAGE = 'image'
+FILM = 'film'
+TV = 'tv'
+
+
+class Record(object):
+    '''
+    An entry read from a file, before it is given a type
+
+    Args:
+        kind (str): what the record is, eg. `BOOK`, or None if the file
+            didn't say
+        type_id (str): the BibType id, if the file has one (eg. CSV files
+            made by this activity)
+    '''
+
+    __slots__ = ('kind', 'type_id', 'fields', 'authors', 'editors')
+
+    def __init__(self, kind=None, type_id=None):
+        self.kind = kind
+        self.type_id = type_id
+        # Common field name -> value
+        self.fields = {}
+        # (last name, first name initials)
+        self.authors = []
+        self.editors = []
+
+    def set(self, field, value):
+        value = u' '.join(value.split())
+        if value and field not in self.fields:
+            self.fields[field] = value
+
+    def set_pages(self, value):
+        pages = [page for page in _PAGE_DASH.split(value) if page]
+        if pages:
+            self.set(interchange.START_PAGE, pages[0])
+            self.set(interchange.END_PAGE, pages[-1])
+
+    def set_year(self, value):
+        m = _YEAR.search(value)
+        if m is not None:
+            self.set(interchange.YEAR, m.group())
+
+
+_PAGE_DASH = re.compile(u'\\s*[-\u2013\u2014]+\\s*')
+_YEAR = re.compile(r'\b\d{4}\b')
+_INITIAL_BREAK = re.compile(r'[\s.~-]+')
+
+
+def _initials(first):
+    # Spaced, like the `A M` example of the encyclopedia type
+    return u' '.join(word[0].upper()
+                    for word in _INITIAL_BREAK.split(first) if word)
+
+
+def _name(last, first=u''):
+    return (u' '.join(last.split()), _initials(first))
+
+
+def _name_parts(name):
+    # (last name, first names)
+    if ',' in name:
+        parts = name.split(',')
+        # "Last, Jr, First" puts the first names last
+        return parts[0], parts[-1]
+    words = name.split()
+    if len(words) < 2:
+        return name, u''
+    start = len(words) - 1
+    for i, word in enumerate(words[:-1]):
+        if word[0].islower():
+            start = i
+            break
+    return u' '.join(words[start:]), u' '.join(words[:start])
+
+
+def split_name(name):
+    '''
+    Returns (last name, initials) for a name written as `Last, First` or
+    `First Last`.  Lowercase words before the last name (eg. `van`) are
+    part of it.
+    '''
+    return _name(*_name_parts(name))
+
+
+# BibType ids for each kind, as (with an author, with two authors,
+# with only an editor, without any) and the same for online sources
+_KIND_TYPES = {
+    BOOK: (('bk', 'bk2', 'bke', 'bkn'), ('eb', 'eb2', 'bke', 'ebn')),
+    ENCYCLOPEDIA: (('encp', 'encp', 'encpn', 'encpn'),
+                   ('encp', 'encp', 'ence', 'ence')),
+    MAGAZINE: (('mag', 'mag', 'magn', 'magn'),
+               ('omag', 'omag', 'omagn', 'omagn')),
+    NEWSPAPER: (('np', 'np', 'npn', 'npn'), ('onp', 'onp', 'onpn', 'onpn')),
+    WEB: (('web', 'web', 'webn', 'webn'), ('web', 'web', 'webn', 'webn')),
+    IMAGE: (('img', 'img', 'imgn', 'imgn'), ('img', 'img', 'imgn', 'imgn')),
+    FILM: (('film',) * 4, ('film',) * 4),
+    TV: (('tv',) * 4, ('tv',) * 4),
+}
+
+
+def _choose_type(record):
+    fields = record.fields
+    kind = record.kind
+    if kind is None:
+        if interchange.CONTAINER in fields:
+            kind = MAGAZINE
+        elif interchange.URL in fields:
+            kind = WEB
+        else:
+            kind = BOOK
+    if kind == TV and interchange.CONTAINER in fields:
+        return 'tvs'
+    choices = _KIND_TYPES[kind][interchange.URL in fields]
+    if len(record.authors) > 1:
+        return choices[1]
+    if record.authors:
+        return choices[0]
+    if record.editors:
+        return choices[2]
+    return choices[3]
+
+
+def make_entry(record):
+    '''
+    Returns an entry for the record, or None if it has nothing to show
+    '''
+    fields = record.fields
+    if interchange.TITLE not in fields and not record.authors:
+        return None
+    type_id = record.type_id
+    if type_id not in TYPES_BY_ID:
+        type_id = _choose_type(record)
+
+    # Authors past the second aren't kept
+    for (last, first), names in [
+            ((interchange.AUTHOR_LAST, interchange.AUTHOR_FIRST),
+             record.authors[:1]),
+            ((interchange.AUTHOR2_LAST, interchange.AUTHOR2_FIRST),
+             record.authors[1:2]),
+            ((interchange.EDITOR_LAST, interchange.EDITOR_FIRST),
+             record.editors[:1])]:
+        for last_name, initials in names:
+            record.set(last, last_name)
+            record.set(first, initials)
+
+    bib_type = TYPES_BY_ID[type_id]
+    return Entry(type_id, [fields.get(name, u'') if name else u''
+                           for name in interchange.type_fields(bib_type)])
+
+
+def _text_file(path):
+    # newline='' keeps the line breaks inside quoted CSV values
+    return io.open(path, encoding='utf-8-sig', errors='replace', newline='')
+
+
+def detect_format(path, mime_type=None):
+    '''
+    Returns `BIBTEX`, `RIS` or `CSV` for the file, going by the mime
+    type if it is known and otherwise by how the file starts
+    '''
+    if mime_type in MIME_TYPES:
+        return MIME_TYPES[mime_type]
+    with _text_file(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] in '@%':
+                return BIBTEX
+            if _RIS_LINE.match(line):
+                return RIS
+            return CSV
+    return CSV
+
+
+# BibTeX
+
+_BIBTEX_KINDS = {
+    'book': BOOK,
+    'booklet': BOOK,
+    'inbook': BOOK,
+    'manual': BOOK,
+    'proceedings': BOOK,
+    'techreport': BOOK,
+    'phdthesis': BOOK,
+    'mastersthesis': BOOK,
+    'thesis': BOOK,
+    'incollection': ENCYCLOPEDIA,
+    'inreference': ENCYCLOPEDIA,
+    'article': MAGAZINE,
+    'inproceedings': MAGAZINE,
+    'conference': MAGAZINE,
+    'online': WEB,
+    'electronic': WEB,
+    'www': WEB,
+    'webpage': WEB,
+    'artwork': IMAGE,
+    'image': IMAGE,
+    'movie': FILM,
+    'video': TV,
+}
+
+_BIBTEX_FIELDS = {
+    'title': interchange.TITLE,
+    'journal': interchange.CONTAINER,
+    'journaltitle': interchange.CONTAINER,
+    'booktitle': interchange.CONTAINER,
+    'series': interchange.CONTAINER,
+    'publisher': interchange.PUBLISHER,
+    'organization': interchange.PUBLISHER,
+    'institution': interchange.PUBLISHER,
+    'school': interchange.PUBLISHER,
+    'address': interchange.PLACE,
+    'location': interchange.PLACE,
+    'edition': interchange.EDITION,
+    'volume': interchange.VOLUME,
+    'number': interchange.ISSUE,
+    'issue': interchange.ISSUE,
+    'month': interchange.DATE,
+    'urldate': interchange.ACCESSED,
+    'url': interchange.URL,
+    'howpublished': interchange.MEDIUM,
+    'license': interchange.LICENSE,
+    'note': interchange.NOTE,
+}
+
+_MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+           'August', 'September', 'October', 'November', 'December']
+_MONTH_MACROS = dict((month[:3].lower(), month) for month in _MONTHS)
+
+_RECORD_START = re.compile(r'@\s*([a-zA-Z]+)\s*([{(])')
+_DELIMITER = re.compile(r'\\.|[{}()]')
+_FIELD_NAME = re.compile(r'[\s,]*([^\s=,{}()"#]+)\s*=\s*')
+_BARE_VALUE = re.compile(r'[^\s,#{}()"]+')
+_CONCATENATE = re.compile(r'\s*#\s*')
+_IN_QUOTES = re.compile(r'\\.|[{}"]')
+_AND = re.compile(r'\\.|[{}]|\s+and\s+')
+
+_ACCENTS = {
+    "'": u'\u0301', '`': u'\u0300', '^': u'\u0302', '"': u'\u0308',
+    '~': u'\u0303', '=': u'\u0304', '.': u'\u0307', 'u': u'\u0306',
+    'v': u'\u030c', 'H': u'\u030b', 'c': u'\u0327', 'd': u'\u0323',
+    'b': u'\u0331', 'k': u'\u0328', 'r': u'\u030a',
+}
+_SYMBOLS = {
+    'ss': u'\u00df', 'o': u'\u00f8', 'O': u'\u00d8', 'ae': u'\u00e6',
+    'AE': u'\u00c6', 'oe': u'\u0153', 'OE': u'\u0152', 'aa': u'\u00e5',
+    'AA': u'\u00c5', 'l': u'\u0142', 'L': u'\u0141', 'i': u'i', 'j': u'j',
+    'textbackslash': u'\\', 'textasciitilde': u'~', 'textasciicircum': u'^',
+    'textendash': u'\u2013', 'textemdash': u'\u2014', 'ldots': u'\u2026',
+    'dots': u'\u2026', 'textellipsis': u'\u2026', 'S': u'\u00a7',
+    'P': u'\u00b6', 'copyright': u'\u00a9', 'pounds': u'\u00a3',
+    'euro': u'\u20ac', 'textquoteleft': u'\u2018',
+    'textquoteright': u'\u2019', 'textquotedblleft': u'\u201c',
+    'textquotedblright': u'\u201d',
+}
+_DASHES = {'--': u'\u2013', '---': u'\u2014'}
+# An accent on a letter, a command with an optional one letter argument
+# (eg. `\c{c}`), an escaped character, dashes, or grouping
+_LATEX = re.compile(
+    r'''\\([`'^"~=.])\s*(?:\{\s*(\\?[a-zA-Z])\s*\}|(\\?[a-zA-Z]))'''
+    r'|\\([a-zA-Z]+)\s*(?:\{\s*(\\?[a-zA-Z])\s*\})?'
+    r'|\\(.)'
+    r'|(-{2,3})'
+    r'|[{}~]')
+
+
+def _accent(accent, letter):
+    if letter.startswith('\\'):
+        # Dotless i and j
+        letter = letter[1:]
+    mark = _ACCENTS.get(accent)
+    if mark is None:
+        return letter
+    return unicodedata.normalize('NFC', letter + mark)
+
+
+def _latex_token(m):
+    accent, braced, bare, command, argument, escaped, dashes = m.groups()
+    if accent is not None:
+        return _accent(accent, braced or bare)
+    if command is not None:
+        if argument is not None and command in _ACCENTS:
+            return _accent(command, argument)
+        symbol = _SYMBOLS.get(command, u'')
+        if argument is not None:
+            symbol += _accent(None, argument)
+        return symbol
+    if escaped is not None:
+        # `\\` is a line break
+        return u' ' if escaped in ' \\' else escaped
+    if dashes is not None:
+        return _DASHES[dashes]
+    return u' ' if m.group() == '~' else u''
+
+
+def latex_to_text(value):
+    '''
+    Returns the text of a BibTeX value, without LaTeX commands or
+    grouping braces
+    '''
+    if '\\' in value or '{' in value or '-' in value or '~' in value:
+        value = _LATEX.sub(_latex_token, value)
+    return u' '.join(value.split())
+
+
+def _split_names(value):
+    # On " and " outside of braces, so "{Barnes and Noble}" is one name
+    names = []
+    depth = 0
+    start = 0
+    for m in _AND.finditer(value):
+        token = m.group()
+        if token == '{':
+            depth += 1
+        elif token == '}':
+            depth = max(depth - 1, 0)
+        elif depth == 0 and not token.startswith('\\'):
+            names.append(value[start:m.start()])
+            start = m.end()
+    names.append(value[start:])
+    return [name for name in names if name.strip()]
+
+
+def _all_braced(value):
+    # True if the first brace only closes at the end of the value
+    if not value.startswith('{'):
+        return False
+    depth = 0
+    for m in _DELIMITER.finditer(value):
+        char = m.group()
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return m.end() == len(value)
+    return False
+
+
+def _bibtex_name(value):
+    value = value.strip()
+    if _all_braced(value):
+        # A name in braces is kept as is, eg. an organisation
+        return _name(latex_to_text(value))
+    last, first = _name_parts(value)
+    # Initials are taken from the text, eg. "{\'E}mile" gives "E"
+    return _name(latex_to_text(last), latex_to_text(first))
+
+
+def _bibtex_records(f):
+    # Yields (entry type, the text between the record's delimiters)
+    parts = []
+    kind = None
+    closer = None
+    depth = 0
+    for line in f:
+        while line:
+            if kind is not None and \
+                    _RECORD_START.match(line.lstrip()) is not None:
+                # The last record was never closed
+                logging.debug('Skipping unclosed BibTeX record %s', kind)
+                kind = None
+            if kind is None:
+                m = _RECORD_START.search(line)
+                if m is None:
+                    break
+                kind = m.group(1).lower()
+                closer = '}' if m.group(2) == '{' else ')'
+                depth = 0
+                parts = []
+                line = line[m.end():]
+
+            end = None
+            for m in _DELIMITER.finditer(line):
+                char = m.group()
+                if char == '{':
+                    depth += 1
+                elif char == '}' and depth > 0:
+                    depth -= 1
+                elif char == closer:
+                    end = m.start()
+                    break
+            if end is None:
+                parts.append(line)
+                break
+            parts.append(line[:end])
+            yield kind, u''.join(parts)
+            kind = None
+            line = line[end + 1:]
+
+
+def _closing(text, pos, pattern, close):
+    # Returns the position of the `close` char that ends a value
+    end = text.find(close, pos)
+    if end >= 0 and '{' not in text[pos:end] and '\\' not in text[pos:end]:
+        # Nothing nested, as in most values
+        return end
+    depth = 0
+    for m in pattern.finditer(text, pos):
+        char = m.group()
+        if char == '{':
+            depth += 1
+        elif char == '}' and depth > 0:
+            depth -= 1
+        elif char == close and depth == 0:
+            return m.start()
+    return len(text)
+
+
+def _bibtex_fields(body, macros):
+    # Yields (lowercase field name, raw value) from the body of a record
+    pos = 0
+    while True:
+        m = _FIELD_NAME.match(body, pos)
+        if m is None:
+            return
+        name = m.group(1).lower()
+        pos = m.end()
+        parts = []
+        while pos < len(body):
+            char = body[pos]
+            if char == '{':
+                end = _closing(body, pos + 1, _DELIMITER, '}')
+                parts.append(body[pos + 1:end])
+                pos = end + 1
+            elif char == '"':
+                end = _closing(body, pos + 1, _IN_QUOTES, '"')
+                parts.append(body[pos + 1:end])
+                pos = end + 1
+            else:
+                bare = _BARE_VALUE.match(body, pos)
+                if bare is None:
+                    break
+                word = bare.group()
+                parts.append(macros.get(word.lower(), word))
+                pos = bare.end()
+            join = _CONCATENATE.match(body, pos)
+            if join is None or '#' not in join.group():
+                break
+            pos = join.end()
+        yield name, u''.join(parts)
+        # Skip anything up to the next field
+        comma = body.find(',', pos)
+        if comma < 0:
+            return
+        pos = comma
+
+
+def _bibtex_record(kind, fields):
+    record = Record(_BIBTEX_KINDS.get(kind))
+    for name, value in fields:
+        if name == 'author':
+            record.authors.extend(_bibtex_name(n)
+                                  for n in _split_names(value))
+        elif name == 'editor':
+            record.editors.extend(_bibtex_name(n)
+                                  for n in _split_names(value))
+        elif name in ('year', 'date'):
+            record.set_year(value)
+            if name == 'date':
+                record.set(interchange.DATE, latex_to_text(value))
+        elif name == 'pages':
+            record.set_pages(latex_to_text(value))
+        elif name in ('url', 'urldate'):
+            # Only braces are escaped in urls
+            record.set(_BIBTEX_FIELDS[name],
+                       value.replace('\\{', '{').replace('\\}', '}'))
+        elif name in _BIBTEX_FIELDS:
+            record.set(_BIBTEX_FIELDS[name], latex_to_text(value))
+    if record.kind == BOOK and record.authors and \
+            interchange.CONTAINER in record.fields:
+        # A chapter: the book's title isn't part of a book entry
+        record.fields.pop(interchange.CONTAINER)
+    return record
+
+
+def parse_bibtex(f):
+    '''
+    Yields a `Record` for each entry of a BibTeX file.  `@string`
+    macros are expanded, `@comment` and `@preamble` are skipped.
+
+    Args:
+        f (file): the file, open as text
+    '''
+    macros = dict(_MONTH_MACROS)
+    for kind, body in _bibtex_records(f):
+        if kind in ('comment', 'preamble'):
+            continue
+        if kind == 'string':
+            for name, value in _bibtex_fields(body, macros):
+                macros[name] = value
+            continue
+        # The citation key goes up to the first comma
+        comma = body.find(',')
+        if comma < 0:
+            continue
+        yield _bibtex_record(kind, _bibtex_fields(body[comma:], macros))
+
+
+# RIS
+
+_RIS_LINE = re.compile(r'([A-Z][A-Z0-9])  ?-(?: (.*))?$')
+
+_RIS_KINDS = {
+    'BOOK': BOOK,
+    'EBOOK': BOOK,
+    'EDBOOK': BOOK,
+    'CHAP': BOOK,
+    'ECHAP': BOOK,
+    'RPRT': BOOK,
+    'THES': BOOK,
+    'ENCYC': ENCYCLOPEDIA,
+    'DICT': ENCYCLOPEDIA,
+    'JOUR': MAGAZINE,
+    'EJOUR': MAGAZINE,
+    'MGZN': MAGAZINE,
+    'CPAPER': MAGAZINE,
+    'CONF': MAGAZINE,
+    'NEWS': NEWSPAPER,
+    'ELEC': WEB,
+    'WEB': WEB,
+    'BLOG': WEB,
+    'ART': IMAGE,
+    'FIGURE': IMAGE,
+    'MPCT': FILM,
+    'VIDEO': TV,
+}
+
+_RIS_TAGS = {
+    'TI': interchange.TITLE,
+    'T1': interchange.TITLE,
+    'CT': interchange.TITLE,
+    'BT': interchange.CONTAINER,
+    'T2': interchange.CONTAINER,
+    'JO': interchange.CONTAINER,
+    'JF': interchange.CONTAINER,
+    'JA': interchange.CONTAINER,
+    'T3': interchange.CONTAINER,
+    'DA': interchange.DATE,
+    'PB': interchange.PUBLISHER,
+    'CY': interchange.PLACE,
+    'PP': interchange.PLACE,
+    'ET': interchange.EDITION,
+    'VL': interchange.VOLUME,
+    'IS': interchange.ISSUE,
+    'SP': interchange.START_PAGE,
+    'EP': interchange.END_PAGE,
+    'Y2': interchange.ACCESSED,
+    'UR': interchange.URL,
+    'L2': interchange.URL,
+    'M3': interchange.MEDIUM,
+    'N1': interchange.NOTE,
+}
+
+
+def parse_ris(f):
+    '''
+    Yields a `Record` for each reference of a RIS file
+
+    Args:
+        f (file): the file, open as text
+    '''
+    record = None
+    for line in f:
+        m = _RIS_LINE.match(line.strip())
+        if m is None:
+            continue
+        tag, value = m.group(1), m.group(2) or u''
+        if tag == 'TY':
+            record = Record(_RIS_KINDS.get(value.strip().upper()))
+        elif record is None:
+            continue
+        elif tag == 'ER':
+            yield record
+            record = None
+        elif tag in ('AU', 'A1'):
+            record.authors.append(split_name(value))
+        elif tag in ('ED', 'A2'):
+            record.editors.append(split_name(value))
+        elif tag in ('PY', 'Y1'):
+            record.set_year(value)
+        elif tag == 'SP' and '-' in value:
+            record.set_pages(value)
+        elif tag in _RIS_TAGS:
+            record.set(_RIS_TAGS[tag], value)
+    if record is not None:
+        # No ER at the end of the file
+        yield record
+
+
+# CSV
+
+# Column names used by reference managers (eg. Zotero) -> common field
+_CSV_COLUMNS = {
+    'author': None,
+    'authors': None,
+    'editor': None,
+    'editors': None,
+    'pages': None,
+    'year': None,
+    'publication year': None,
+    'title': interchange.TITLE,
+    'journal': interchange.CONTAINER,
+    'publication title': interchange.CONTAINER,
+    'publication': interchange.CONTAINER,
+    'booktitle': interchange.CONTAINER,
+    'series': interchange.CONTAINER,
+    'publisher': interchange.PUBLISHER,
+    'place': interchange.PLACE,
+    'address': interchange.PLACE,
+    'location': interchange.PLACE,
+    'edition': interchange.EDITION,
+    'volume': interchange.VOLUME,
+    'issue': interchange.ISSUE,
+    'number': interchange.ISSUE,
+    'date': interchange.DATE,
+    'month': interchange.DATE,
+    'access date': interchange.ACCESSED,
+    'accessed': interchange.ACCESSED,
+    'urldate': interchange.ACCESSED,
+    'url': interchange.URL,
+    'link': interchange.URL,
+    'rights': interchange.LICENSE,
+    'license': interchange.LICENSE,
+    'format': interchange.MEDIUM,
+    'medium': interchange.MEDIUM,
+    'note': interchange.NOTE,
+    'notes': interchange.NOTE,
+    'extra': interchange.NOTE,
+}
+
+_CSV_KINDS = {
+    'book': BOOK,
+    'booksection': BOOK,
+    'report': BOOK,
+    'thesis': BOOK,
+    'encyclopediaarticle': ENCYCLOPEDIA,
+    'dictionaryentry': ENCYCLOPEDIA,
+    'journalarticle': MAGAZINE,
+    'magazinearticle': MAGAZINE,
+    'conferencepaper': MAGAZINE,
+    'newspaperarticle': NEWSPAPER,
+    'webpage': WEB,
+    'blogpost': WEB,
+    'artwork': IMAGE,
+    'film': FILM,
+    'tvbroadcast': TV,
+    'videorecording': TV,
+}
+_CSV_KINDS.update(_BIBTEX_KINDS)
+_CSV_KINDS.update((code.lower(), kind) for code, kind in _RIS_KINDS.items())
+
+_NAME_LIST = re.compile(r'\s*;\s*|\s+and\s+')
+
+
+def _csv_rows(f):
+    if sys.version_info[0] == 2:
+        # The Python 2 csv module only reads byte strings
+        reader = csv.reader(line.encode('utf-8') for line in f)
+        return ([cell.decode('utf-8') for cell in row] for row in reader)
+    return csv.reader(f)
+
+
+def parse_csv(f):
+    '''
+    Yields a `Record` for each row of a CSV file.  The first row names
+    the columns: either the columns written by `export.CSVFormat`, or
+    common column names like `Author`, `Title` and `Year`.
+
+    Args:
+        f (file): the file, open as text
+    '''
+    rows = _csv_rows(f)
+    header = [name.strip().lower() for name in next(rows, [])]
+    # Files written by this activity have the BibType id in `type`
+    own = set(interchange.FIELDS).issubset(header)
+    type_column = header.index('type') if 'type' in header else \
+        header.index('item type') if 'item type' in header else None
+
+    for row in rows:
+        if not any(cell.strip() for cell in row):
+            continue
+        kind = type_id = None
+        if type_column is not None and type_column < len(row):
+            code = row[type_column].strip()
+            if own:
+                type_id = code
+            kind = _CSV_KINDS.get(code.lower())
+        record = Record(kind, type_id)
+        names = {}
+        for name, value in zip(header, row):
+            if own:
+                if name in interchange.FIELDS:
+                    record.set(name, value)
+            elif name in ('author', 'authors', 'editor', 'editors'):
+                names[name[:6]] = [split_name(n)
+                                   for n in _NAME_LIST.split(value)
+                                   if n.strip()]
+            elif name == 'pages':
+                record.set_pages(value)
+            elif name in ('year', 'publication year'):
+                record.set_year(value)
+            elif name in _CSV_COLUMNS:
+                record.set(_CSV_COLUMNS[name], value)
+        record.authors = names.get('author', [])
+        record.editors = names.get('editor', [])
+        if own and type_id not in TYPES_BY_ID:
+            record.type_id = None
+        yield record
+
+
+PARSERS = {BIBTEX: parse_bibtex, RIS: parse_ris, CSV: parse_csv}
+
+
+class ImportJob(object):
+    '''
+    Reads the entries of a file on a worker thread.  Their markup,
+    search words and duplicate fingerprints are made there too, in
+    batches, so adding them to the list only has to insert the rows.
+
+    The callbacks are called from the main loop.
+
+    Args:
+        path (str): file to read
+        mime_type (str): mime type of the file, if known
+        progress_cb (callable): called with the job and the number of
+            entries read so far
+        done_cb (callable): called with the job when it has finished,
+            been cancelled (`cancelled`) or failed (`error`).  The new
+            entries are in `entries`, and their (markup, words,
+            fingerprint) in `prepared`, see `MainList.import_entries`.
+    '''
+
+    def __init__(self, path, mime_type, progress_cb, done_cb):
+        self.path = path
+        self.mime_type = mime_type
+        self.entries = []
+        self.prepared = []
+        # Records without a title or author
+        self.skipped = 0
+        self.cancelled = False
+        self.error = None
+        self._progress_cb = progress_cb
+        self._done_cb = done_cb
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _add_batch(self, batch):
+        self.entries.extend(batch)
+        self.prepared.extend(
+            (markup, entry_words(entry.values), entry_fingerprint(entry))
+            for entry, markup in zip(batch, render_entries(batch)))
+        GLib.idle_add(self._progress_cb, self, len(self.entries))
+
+    def _read(self, f):
+        parse = PARSERS[detect_format(self.path, self.mime_type)]
+        batch = []
+        for record in parse(f):
+            if self.cancelled:
+                return
+            entry = make_entry(record)
+            if entry is None:
+                self.skipped += 1
+                continue
+            batch.append(entry)
+            if len(batch) == BATCH_SIZE:
+                self._add_batch(batch)
+                batch = []
+        if batch:
+            self._add_batch(batch)
+
+    def _run(self):
+        try:
+            with _text_file(self.path) as f:
+                self._read(f)
+        except Exception as e:
+            logging.exception('Importing failed')
+            self.error = e
+        GLib.idle_add(self._done_cb, self)
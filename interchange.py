@@ -0,0 +1,159 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+'''
+The fields of entries by what they mean, so that entries can be moved to
+and from other reference formats (BibTeX, RIS and CSV).
+
+Every type's fields are labelled differently (eg. `Title of Webpage`,
+`Tite of Article`), so each untranslated label maps to one common field
+name here.
+'''
+
+AUTHOR_LAST = 'author_last'
+AUTHOR_FIRST = 'author_first'
+AUTHOR2_LAST = 'author2_last'
+AUTHOR2_FIRST = 'author2_first'
+EDITOR_LAST = 'editor_last'
+EDITOR_FIRST = 'editor_first'
+YEAR = 'year'
+TITLE = 'title'
+CONTAINER = 'container'
+PUBLISHER = 'publisher'
+PLACE = 'place'
+EDITION = 'edition'
+VOLUME = 'volume'
+ISSUE = 'issue'
+DATE = 'date'
+START_PAGE = 'start_page'
+END_PAGE = 'end_page'
+ACCESSED = 'accessed'
+URL = 'url'
+LICENSE = 'license'
+MEDIUM = 'medium'
+NOTE = 'note'
+
+# The columns of the CSV format, after the type
+FIELDS = [AUTHOR_LAST, AUTHOR_FIRST, AUTHOR2_LAST, AUTHOR2_FIRST,
+          EDITOR_LAST, EDITOR_FIRST, YEAR, TITLE, CONTAINER, PUBLISHER,
+          PLACE, EDITION, VOLUME, ISSUE, DATE, START_PAGE, END_PAGE,
+          ACCESSED, URL, LICENSE, MEDIUM, NOTE]
+
+LABEL_FIELDS = {
+    'Last Name': AUTHOR_LAST,
+    'Author 1 Last Name': AUTHOR_LAST,
+    'Screen Name or User Name': AUTHOR_LAST,
+    'Name of Organisation': AUTHOR_LAST,
+    'First Name Initial': AUTHOR_FIRST,
+    'Author 1 First Name Initial': AUTHOR_FIRST,
+    'Author 2 Last Name': AUTHOR2_LAST,
+    'Author 2 First Name Initial': AUTHOR2_FIRST,
+    'Editor Last Name': EDITOR_LAST,
+    'Editor First Name Initial': EDITOR_FIRST,
+    'Year of Publication': YEAR,
+    'Year Created': YEAR,
+    'Year of Broadcast': YEAR,
+    'Last Update': YEAR,
+    'Title': TITLE,
+    'Title of Article': TITLE,
+    'Tite of Article': TITLE,
+    'Title or Description': TITLE,
+    'Title of Webpage': TITLE,
+    'Episode Title': TITLE,
+    'Title of Encyclopedia': CONTAINER,
+    'Title of Magazine': CONTAINER,
+    'Title of Newspaper': CONTAINER,
+    'Series Title': CONTAINER,
+    'Publisher': PUBLISHER,
+    'Distributor': PUBLISHER,
+    'Television Channel': PUBLISHER,
+    'Sponsor or Orginisation': PUBLISHER,
+    'Place of Publication': PLACE,
+    'Place (if available)': PLACE,
+    'Edition (if applicable)': EDITION,
+    'Volume Number': VOLUME,
+    'Volume (if applicable)': VOLUME,
+    'Issue (if applicable)': ISSUE,
+    'Date of Issue': DATE,
+    'Date of Issue (if applicable)': DATE,
+    'Date of Broadcast': DATE,
+    'Starting Page': START_PAGE,
+    'Finishing Page': END_PAGE,
+    'Accessed': ACCESSED,
+    'URL': URL,
+    'License URL (if available)': LICENSE,
+    'Format': MEDIUM,
+    'Special Credits or Other Information': NOTE,
+}
+
+# BibType id -> (BibTeX entry type, RIS type)
+TYPE_CODES = {
+    'bk': ('book', 'BOOK'),
+    'bk2': ('book', 'BOOK'),
+    'bkn': ('book', 'BOOK'),
+    'bke': ('book', 'EDBOOK'),
+    'eb': ('book', 'EBOOK'),
+    'eb2': ('book', 'EBOOK'),
+    'ebn': ('book', 'EBOOK'),
+    'ence': ('incollection', 'ENCYC'),
+    'encp': ('incollection', 'ENCYC'),
+    'encpn': ('incollection', 'ENCYC'),
+    'mag': ('article', 'MGZN'),
+    'magn': ('article', 'MGZN'),
+    'omag': ('article', 'MGZN'),
+    'omagn': ('article', 'MGZN'),
+    'np': ('article', 'NEWS'),
+    'npn': ('article', 'NEWS'),
+    'onp': ('article', 'NEWS'),
+    'onpn': ('article', 'NEWS'),
+    'img': ('misc', 'ART'),
+    'imgs': ('misc', 'ART'),
+    'imgn': ('misc', 'ART'),
+    'web': ('misc', 'ELEC'),
+    'webo': ('misc', 'ELEC'),
+    'webn': ('misc', 'ELEC'),
+    'film': ('misc', 'MPCT'),
+    'tv': ('misc', 'VIDEO'),
+    'tvs': ('misc', 'VIDEO'),
+}
+
+# BibType id -> [common field name for each of its fields]
+_type_fields = {}
+
+
+def type_fields(bib_type):
+    '''
+    Returns the common name of each of the type's fields, or None for
+    fields that have none
+    '''
+    fields = _type_fields.get(bib_type.id)
+    if fields is None:
+        fields = _type_fields[bib_type.id] = \
+            [LABEL_FIELDS.get(label) for label in bib_type.labels]
+    return fields
+
+
+def entry_fields(entry):
+    '''
+    Returns a dict of common field name -> value for the fields of the
+    entry that are filled in
+    '''
+    fields = {}
+    for name, value in zip(type_fields(entry.bib_type), entry.values):
+        value = value.strip()
+        if name is not None and value:
+            fields[name] = value
+    return fields
@@ -0,0 +1,181 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+'''
+Read the items of a JSON array from a file one at a time, without
+decoding the whole file first.
+
+Only the items that are yielded are decoded.  Everything else (eg. the
+session history in a Browse journal entry) is scanned over and thrown
+away as the file is read, so memory use doesn't grow with the file.
+'''
+
+import re
+import json
+
+_NON_SPACE = re.compile(r'\S')
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_IN_STRING = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r'[,\]}\s]')
+
+
+class _Scanner(object):
+
+    def __init__(self, f, chunk_size):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buf = ''
+        self.pos = 0
+
+    def _fill(self, keep_from):
+        # Read more of the file, dropping the buffer before `keep_from`.
+        # Returns how far the buffer moved, or None at the end of the file
+        data = self._f.read(self._chunk_size)
+        if not data:
+            return None
+        self._buf = self._buf[keep_from:] + data
+        return keep_from
+
+    def peek(self):
+        '''
+        Move to the next non-whitespace character and return it, or an
+        empty string at the end of the file
+        '''
+        while True:
+            m = _NON_SPACE.search(self._buf, self.pos)
+            if m is not None:
+                self.pos = m.start()
+                return self._buf[self.pos]
+            shift = self._fill(len(self._buf))
+            if shift is None:
+                self.pos = len(self._buf)
+                return ''
+            self.pos = 0
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('Expected {!r} at offset {} of JSON data'
+                             .format(char, self.pos))
+        self.pos += 1
+
+    def _value_end(self, keep):
+        # Find the end of the value that starts at self.pos.  If `keep`
+        # is false, the buffer is thrown away as it is scanned
+        i = self.pos
+        if self._buf[i] not in '[{"':
+            while True:
+                m = _SCALAR_END.search(self._buf, i)
+                if m is not None:
+                    return m.start()
+                i = len(self._buf)
+                shift = self._fill(self.pos)
+                if shift is None:
+                    return len(self._buf)
+                self.pos -= shift
+                i -= shift
+
+        depth = 0
+        in_string = False
+        while True:
+            pattern = _IN_STRING if in_string else _STRUCTURE
+            m = pattern.search(self._buf, i)
+            if m is None:
+                i = max(i, len(self._buf))
+                shift = self._fill(self.pos if keep else len(self._buf))
+                if shift is None:
+                    raise ValueError('Unexpected end of JSON data')
+                self.pos -= shift
+                i -= shift
+                continue
+
+            char = m.group()
+            i = m.end()
+            if in_string:
+                if char == '\\':
+                    i += 1  # Skip the escaped character
+                else:
+                    in_string = False
+                    if depth == 0:
+                        return i
+            elif char == '"':
+                in_string = True
+            elif char in '[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return i
+
+    def decode(self):
+        '''
+        Decode the value at the current position and move past it
+        '''
+        self.peek()
+        end = self._value_end(keep=True)
+        value = json.loads(self._buf[self.pos:end])
+        self.pos = end
+        return value
+
+    def skip(self):
+        '''
+        Move past the value at the current position without decoding it
+        '''
+        self.peek()
+        self.pos = max(self._value_end(keep=False), 0)
+
+
+def iter_array(f, key=None, chunk_size=64 * 1024):
+    '''
+    Yield the decoded items of a JSON array in a file, one at a time.
+
+    Args:
+        f (file): file to read the JSON document from
+        key (str): if given, the document is an object and the items of
+            the array stored under that key are read.  Nothing is
+            yielded if the object has no such key.
+        chunk_size (int): how much of the file to read at once
+    '''
+    scanner = _Scanner(f, chunk_size)
+
+    if key is not None:
+        scanner.expect('{')
+        while True:
+            char = scanner.peek()
+            if char == '}':
+                return
+            if char == ',':
+                scanner.pos += 1
+                continue
+            if char == '':
+                raise ValueError('Unexpected end of JSON data')
+
+            name = scanner.decode()
+            scanner.expect(':')
+            if name == key and scanner.peek() == '[':
+                break
+            scanner.skip()
+
+    scanner.expect('[')
+    while True:
+        char = scanner.peek()
+        if char == ']':
+            return
+        if char == ',':
+            scanner.pos += 1
+            continue
+        if char == '':
+            raise ValueError('Unexpected end of JSON data')
+        yield scanner.decode()
@@ -1,9 +1,11 @@
-import json
 import logging
+from bisect import bisect_right
+from collections import OrderedDict
 from gettext import gettext as _
 
 from gi.repository import Gtk
 from gi.repository import Gdk
+from gi.repository import GLib
 from gi.repository import Pango
 from gi.repository import GObject
 
@@ -18,42 +20,88 @@ except ImportError:
     NEW_INVOKER = False
     from sugar3.graphics.palette import CellRendererInvoker
 
+from oplog import OperationLog
+from entry import render_entries
+from search import SearchIndex
+from duplicates import DuplicateIndex
+from sorting import harvard_key, sort_order
+
 
 class MainList(Gtk.TreeView):
     '''
     Manages the list of references.  The list is made from:
 
-        Bib. text (str)
-        Bib. type (str)
-        Bib. data (list[str] as json str)
+        Bib. text (str, markup made from the entry)
+        Bib. id (str, the id of the `Entry`)
+
+    The entries themselves are kept in a dictionary keyed by their id.
+    When searching, the view shows a filter of the store instead.
+
+    The store isn't sorted by Gtk.  Each row's sort key is made once when
+    it is added, and the keys are kept in a list in the same order as
+    the store, so new rows are inserted at their place by bisecting.
     '''
 
     __gtype_name__ = 'BibliographyMainList'
     __gsignals__ = {
-        'deleted-row': (GObject.SIGNAL_RUN_FIRST, None, (str, str, str)),
-        'edit-row': (GObject.SIGNAL_RUN_FIRST, None, (str, str))
+        'deleted-row': (GObject.SIGNAL_RUN_FIRST, None, (str,)),
+        'edit-row': (GObject.SIGNAL_RUN_FIRST, None, (object,))
     }
 
     COLUMN_TEXT = 0
-    COLUMN_TYPE = 1
-    COLUMN_DATA = 2
+    COLUMN_ID = 1
+
+    # When loading, this many rows are shown straight away and the
+    # rest are added in batches when the main loop is idle
+    LOAD_FIRST_ROWS = 50
+    LOAD_BATCH_SIZE = 250
 
     def __init__(self, scrolled_window, collab):
         self._collab = collab
-        self._store = Gtk.ListStore(str, str, str)
-
-        self._sort = Gtk.TreeModelSort(self._store)
-        self._store.set_sort_column_id(self.COLUMN_TEXT,
-                                       Gtk.SortType.ASCENDING)
-        Gtk.TreeView.__init__(self, self._sort)
+        self._store = Gtk.ListStore(str, str)
+        # Entry id -> Entry, for the entries in the store
+        self._entries = {}
+        # Entry id -> Gtk.TreeIter.  ListStore iters stay valid until their
+        # row is removed, even when the store is re-sorted, and unlike
+        # Gtk.TreeRowReference they don't all need updating on every insert
+        self._iters = {}
+        # Entry id -> Entry, for entries waiting for the idle loader
+        self._pending = OrderedDict()
+        # Entry id -> (markup, words, fingerprint) for pending entries that
+        # were made ready on another thread, see `import_entries`
+        self._prepared = {}
+        self._load_source = None
+        # What gets written to the journal
+        self.log = OperationLog(self.all)
+
+        self.search_index = SearchIndex()
+        self._query = ''
+        # Ids of the entries matching the query, None if not searching
+        self._matches = None
+        self._filter = None
+
+        self.duplicate_index = DuplicateIndex()
+
+        # Sort key and entry id of each row of the store, in the same
+        # order, so the rows never need reading back from the store
+        self._keys = []
+        self._ids = []
+        self._sort_key = harvard_key
+
+        Gtk.TreeView.__init__(self, self._store)
 
         self.props.headers_visible = False
         self.props.rules_hint = True
 
-        renderer = TextRenderer(self)
-        column = Gtk.TreeViewColumn('Bibliography', renderer, markup=0)
+        self._renderer = TextRenderer(self)
+        column = Gtk.TreeViewColumn('Bibliography', self._renderer)
+        column.set_cell_data_func(self._renderer,
+                                  self._renderer.cell_data_func)
         column.props.max_width = 0
         self.append_column(column)
+        self._column = column
+        self._wrap_source = None
+        self.connect('size-allocate', self.__size_allocate_cb)
 
         if NEW_INVOKER:
             self._invoker = TreeViewInvoker()
@@ -63,7 +111,28 @@ class MainList(Gtk.TreeView):
             scrolld.connect('scroll-start', self.__scroll_start_cb)
             scrolld.connect('scroll-end', self.__scroll_end_cb)
 
-        self._editing_iter = None
+        self._editing_id = None
+        self.connect('destroy', self.__destroy_cb)
+
+    def __destroy_cb(self, widget):
+        self.cancel_load()
+        if self._wrap_source is not None:
+            GLib.source_remove(self._wrap_source)
+            self._wrap_source = None
+
+    def __size_allocate_cb(self, widget, allocation):
+        # Changing the wrap width while allocating would resize the view
+        # again straight away, so it waits until the main loop is idle
+        if self._wrap_source is None:
+            self._wrap_source = GLib.idle_add(self.__wrap_idle_cb)
+
+    def __wrap_idle_cb(self):
+        self._wrap_source = None
+        if self._renderer.set_wrap_width(self._column.get_width()):
+            # The tree view measures the visible rows again straight
+            # away, and the rest a few at a time when it is idle
+            self._column.queue_resize()
+        return False
 
     def __scroll_start_cb(self, event):
         self._invoker.detach()
@@ -71,76 +140,366 @@ class MainList(Gtk.TreeView):
     def __scroll_end_cb(self, event):
         self._invoker.attach_treeview(self)
 
-    def add(self, text, type_, data):
-        self._store.append([text, type_, data])
+    def __contains__(self, id_):
+        return id_ in self._entries or id_ in self._pending
+
+    def is_empty(self):
+        return not self._entries and not self._pending
+
+    def _insert(self, entries, markups, bulk=False, prepared=None):
+        # `prepared` has the (words, fingerprint) of each entry, or None
+        if prepared is None:
+            prepared = [None] * len(entries)
+        # Index first, so that the filter knows if the new rows match
+        for entry, ready in zip(entries, prepared):
+            if entry.id not in self.search_index:
+                self.search_index.add(entry.id, entry.values,
+                                      ready and ready[0])
+        self._refresh_matches()
+
+        for entry, markup, ready in zip(entries, markups, prepared):
+            self.duplicate_index.add(entry.id, entry, ready and ready[1])
+            self._entries[entry.id] = entry
+            key = self._sort_key(entry)
+            if bulk:
+                # Sorted all at once below
+                self._keys.append(key)
+                self._ids.append(entry.id)
+                i = self._store.append([markup, entry.id])
+            else:
+                position = bisect_right(self._keys, key)
+                self._keys.insert(position, key)
+                self._ids.insert(position, entry.id)
+                i = self._store.insert(position, [markup, entry.id])
+            self._iters[entry.id] = i
+
+        if bulk and entries:
+            self._reorder(self._keys)
+
+    def _reorder(self, keys):
+        # Put the store in the order of the keys, one per row
+        if not keys:
+            return
+        order = sort_order(keys)
+        self._store.reorder(order)
+        self._keys = [keys[i] for i in order]
+        self._ids = [self._ids[i] for i in order]
+
+    def set_sort_key(self, key):
+        '''
+        Change the order of the list.  The keys of every row are made
+        once and sorted together, then the store is reordered in one go.
+
+        Args:
+            key (callable): makes the sort key of an entry, see
+                `sorting.make_sort_key`
+        '''
+        self._sort_key = key
+        entries = self._entries
+        self._reorder([key(entries[id_]) for id_ in self._ids])
+
+    def _position(self, id_):
+        return self._store.get_path(self._iters[id_]).get_indices()[0]
+
+    def add(self, entry):
+        '''
+        Add an entry to the list.  Returns False if an entry with the
+        same id is already in the list (eg. a message that was sent
+        twice), in which case nothing is changed.
+        '''
+        if entry.id in self:
+            return False
+        self._insert([entry], [entry.markup])
+        self.log.add(entry)
+        return True
+
+    def add_many(self, entries):
+        '''
+        Add a lot of entries at once, eg. when loading a file.
+
+        Inserting a row sends a signal through the filter to the view.
+        Instead, the view and filter are dropped while the rows are
+        appended, and the store is put in order once at the end.
+        '''
+        self.set_model(None)
+        self._filter = None
+        try:
+            entries = [entry for entry in entries if entry.id not in self]
+            self._insert(entries, render_entries(entries), bulk=True)
+        finally:
+            self._attach_model()
+
+    def _attach_model(self):
+        if self._matches is None:
+            self._filter = None
+            self.set_model(self._store)
+        else:
+            self._filter = self._store.filter_new()
+            self._filter.set_visible_func(self.__filter_visible_cb)
+            self.set_model(self._filter)
+
+    def __filter_visible_cb(self, model, iter_, data):
+        return self._matches is None or \
+            model.get_value(iter_, self.COLUMN_ID) in self._matches
+
+    def _refresh_matches(self):
+        if self._matches is not None:
+            self._matches = self.search_index.search(self._query)
+
+    def search(self, query):
+        '''
+        Only show the entries that have all the words in the query, or
+        show every entry if the query is empty
+        '''
+        self._query = query
+        self._matches = self.search_index.search(query)
+        if self._matches is not None and self._filter is not None:
+            self._filter.refilter()
+        else:
+            self._attach_model()
+
+    def get_entry(self, id_):
+        return self._entries.get(id_) or self._pending.get(id_)
 
     def all(self):
-        return [row[:] for row in self._store]
-
-    def load_json(self, list_):
+        '''
+        Returns a list of all the entries, including the ones that are
+        still loading (as they need to be saved too)
+        '''
+        entries = self._entries
+        return [entries[id_] for id_ in self._ids] + \
+            list(self._pending.values())
+
+    def load_entries(self, entries, log=True):
+        '''
+        Load entries from a file or another collaborator.  The first
+        screenful is added straight away, and the rest are streamed in
+        from an idle callback so that the activity stays responsive.
+
+        Args:
+            entries (list[Entry]): entries to load
+            log (bool): add the new entries to the operation log, False
+                if they were read from the log
+        '''
         # Only add entries we don't already have, eg resuming shared activity
-        for row in list_:
-            if row not in self._store:
-                self._store.append(row)
+        new_entries = []
+        new_ids = set()
+        for entry in entries:
+            if entry.id not in self and entry.id not in new_ids:
+                new_entries.append(entry)
+                new_ids.add(entry.id)
             else:
                 # Somebody added this offline
                 self._collab.post(dict(
                     action='add_item',
-                    args=row
+                    args=entry.to_json()
                 ))
 
-    def edit(self, row):
-        self._editing_iter = None
-        for i in self._store:
-            if list(i) == row:
-                self._editing_iter = i.iter
-                break
-        if self._editing_iter is None:
-            logging.error('Trying to edit a row that does not exist')
-            logging.error('Row: {}'.format(self._editing_iter))
+        if log:
+            for entry in new_entries:
+                self.log.add(entry)
+        if self._load_source is None:
+            self.add_many(new_entries[:self.LOAD_FIRST_ROWS])
+            new_entries = new_entries[self.LOAD_FIRST_ROWS:]
+        for entry in new_entries:
+            self._pending[entry.id] = entry
+        if self._pending and self._load_source is None:
+            self._load_source = GLib.idle_add(self.__load_idle_cb)
+
+    def import_entries(self, entries, prepared):
+        '''
+        Add entries read from another kind of file, and add them to the
+        operation log.  They are streamed in by the idle loader, like
+        `load_entries`, but everything that only depends on the entry
+        was already done on the import's thread.
+
+        Args:
+            entries (list[Entry]): entries to add
+            prepared (list): the (markup, words, fingerprint) of each
+                entry, see `importer.ImportJob`
+
+        Returns the entries that will be added
+        '''
+        new_entries = []
+        for entry, ready in zip(entries, prepared):
+            if entry.id in self:
+                continue
+            new_entries.append(entry)
+            self.log.add(entry)
+            self._pending[entry.id] = entry
+            self._prepared[entry.id] = ready
+        if self._pending and self._load_source is None:
+            self._load_source = GLib.idle_add(self.__load_idle_cb)
+        return new_entries
+
+    def __load_idle_cb(self):
+        # Each row is inserted at its place, so that rows appear in the
+        # right order as they stream in
+        batch = [self._pending.popitem(last=False)[1] for i in
+                 range(min(self.LOAD_BATCH_SIZE, len(self._pending)))]
+        prepared = [self._prepared.pop(entry.id, None) for entry in batch]
+        rendered = iter(render_entries(
+            [entry for entry, ready in zip(batch, prepared)
+             if ready is None]))
+        markups = [next(rendered) if ready is None else ready[0]
+                   for ready in prepared]
+        self._insert(batch, markups,
+                     prepared=[ready and ready[1:] for ready in prepared])
+
+        if self._pending:
+            return True
+        self._load_source = None
+        return False
+
+    def cancel_load(self):
+        '''
+        Stop adding entries from the idle loader, eg. when the activity
+        is closed while a big file is still loading
+        '''
+        if self._load_source is not None:
+            GLib.source_remove(self._load_source)
+            self._load_source = None
+        self._pending.clear()
+        self._prepared.clear()
+
+    def edit(self, id_):
+        self._editing_id = id_
+        if id_ not in self._entries:
+            logging.error('Trying to edit an entry that does not exist')
+            logging.error('Entry: {}'.format(id_))
+            self._editing_id = None
             return
 
-        self.emit('edit-row', row[self.COLUMN_TYPE], row[self.COLUMN_DATA])
-
-    def edited_row_cb(self, window, *row):
-        if self._editing_iter is None:
-            logging.error('No editing_iter when edited_row_cb is called')
+        self.emit('edit-row', self._entries[id_])
+
+    def _replace(self, entry):
+        self.search_index.update(entry.id, entry.values)
+        self._refresh_matches()
+        self.duplicate_index.update(entry.id, entry)
+        self._entries[entry.id] = entry
+        i = self._iters[entry.id]
+        self._renderer.forget(entry.id)
+        self._store.set_value(i, self.COLUMN_TEXT, entry.markup)
+        self._move(i, self._position(entry.id), self._sort_key(entry))
+        self.log.edit(entry)
+
+    def _move(self, i, old, key):
+        # Move the row from the old position to its place for the key
+        del self._keys[old]
+        id_ = self._ids.pop(old)
+        new = bisect_right(self._keys, key)
+        self._keys.insert(new, key)
+        self._ids.insert(new, id_)
+        # Until it moves, the row is still in the store at the old position
+        if new < old:
+            self._store.move_before(i, self._store.iter_nth_child(None, new))
+        elif new > old:
+            self._store.move_after(i, self._store.iter_nth_child(None, new))
+
+    def edited_row_cb(self, window, entry):
+        if self._editing_id not in self._entries:
+            logging.error('No editing row when edited_row_cb is called')
             return
 
-        self._store.set(self._editing_iter, range(3), row)
-	self._collab.post(dict(
+        entry = self._entries[self._editing_id].replace(entry)
+        self._replace(entry)
+        self._collab.post(dict(
             action='edit_item',
-            path=self._store.get_string_from_iter(self._editing_iter),
-            args=row
+            args=entry.to_json()
         ))
 
         window.hide()
         window.get_parent().remove(window)
 
-    def edited_via_collab(self, path, row):
-        i = self._store.get_iter_from_string(path)
-        self._store.set(i, range(3), row)
+    def edited_via_collab(self, entry):
+        if entry.id in self._pending:
+            self._pending[entry.id] = entry
+            self._prepared.pop(entry.id, None)
+            # Indexed again when it is added to the store
+            self.search_index.remove(entry.id)
+            self.log.edit(entry)
+            return
+        if entry.id not in self._entries:
+            logging.error('Got an edit for an entry that does not exist')
+            return
+        self._replace(entry)
 
-    def delete(self, delete_row):
-        for row in self._store:
-            if list(row) == delete_row:
-                self._store.remove(row.iter)
-                self.emit('deleted-row', *delete_row)
-                return
+    def delete(self, id_):
+        self._prepared.pop(id_, None)
+        if self._pending.pop(id_, None) is not None:
+            self.search_index.remove(id_)
+            self.log.delete(id_)
+            return
+        if id_ not in self._iters:
+            return
+        position = self._position(id_)
+        del self._keys[position]
+        del self._ids[position]
+        i = self._iters.pop(id_)
+        del self._entries[id_]
+        self._renderer.forget(id_)
+        self.search_index.remove(id_)
+        self.duplicate_index.remove(id_)
+        if self._matches is not None:
+            self._matches.discard(id_)
+        self.log.delete(id_)
+
+        self._store.remove(i)
+        self.emit('deleted-row', id_)
+
+    def duplicates_of(self, id_):
+        '''
+        Returns the ids of the other entries that look like copies of
+        the entry with the id
+        '''
+        return self.duplicate_index.duplicates_of(id_)
+
+    def find_duplicates(self):
+        '''
+        Returns the ids of the entries that look like copies of other
+        entries.  From each group of copies, the one with the most
+        fields filled in is kept out of the list.
+        '''
+        copies = []
+        for ids in self.duplicate_index.groups():
+            ids.sort(key=lambda id_: sum(
+                1 for value in self._entries[id_].values if value.strip()))
+            copies.extend(ids[:-1])
+        return copies
 
     def create_palette(self, path, column):
-        row = list(self.get_model()[path])
-        return ItemPalette(row, self, self._collab)
+        id_ = self.get_model()[path][self.COLUMN_ID]
+        return ItemPalette(self._entries[id_], self, self._collab)
 
 
 class TextRenderer(Gtk.CellRendererText):
+    '''
+    Renders the markup of each row.  The markup of the rows shown
+    recently is kept parsed, and the height of a row is only measured
+    once for each wrap width, instead of on every scroll and redraw.
+    '''
+
+    # Number of widths to keep the heights of rows for
+    HEIGHT_WIDTHS = 3
+    # Number of rows to keep parsed, a few screenfuls
+    PARSED_ROWS = 150
 
     def __init__(self, tree_view):
         Gtk.CellRendererText.__init__(self)
         self._tree_view = tree_view
+        # Row id -> (text, Pango.AttrList), least recently shown first.
+        # Rows are dropped with `forget` when their markup changes.
+        self._parsed = OrderedDict()
+        # (wrap width, width) -> row id -> (minimum, natural) height.
+        # Only the last few widths are kept, so that rotating the screen
+        # back doesn't measure every row again.
+        self._heights = OrderedDict()
+        # Id of the row that the properties are set for
+        self._row_id = None
         screen = Gdk.Screen.get_default()
 
         self.props.font_desc = Pango.FontDescription('sans 16')
+        # Until the column is allocated, see `set_wrap_width`
         self.props.wrap_width = screen.get_width()
         self.props.wrap_mode = Pango.WrapMode.WORD_CHAR
 
@@ -148,17 +507,68 @@ class TextRenderer(Gtk.CellRendererText):
             self._invoker = CellRendererInvoker()
             self._invoker.attach_cell_renderer(tree_view, self)
 
+    def cell_data_func(self, column, cell, model, iter_, data):
+        id_ = model.get_value(iter_, MainList.COLUMN_ID)
+        parsed = self._parsed.pop(id_, None)
+        if parsed is None:
+            markup = model.get_value(iter_, MainList.COLUMN_TEXT)
+            try:
+                ok, attrs, text, accel = Pango.parse_markup(markup, -1, u'\0')
+            except GLib.Error as e:
+                logging.error('Bad markup for row %s: %s', id_, e)
+                attrs, text = Pango.AttrList(), markup
+            parsed = (text, attrs)
+            while len(self._parsed) >= self.PARSED_ROWS:
+                self._parsed.popitem(last=False)
+        self._parsed[id_] = parsed
+
+        self._row_id = id_
+        self.props.text = parsed[0]
+        self.props.attributes = parsed[1]
+
+    def forget(self, id_):
+        '''
+        Drop what is cached for a row, when its text changes
+        '''
+        self._parsed.pop(id_, None)
+        for heights in self._heights.values():
+            heights.pop(id_, None)
+
+    def set_wrap_width(self, column_width):
+        '''
+        Wrap the text to fit a column of the width.  Returns True if
+        the wrap width changed, so the rows need measuring again.
+        '''
+        wrap_width = column_width - 2 * self.props.xpad
+        # Not allocated yet
+        if wrap_width <= 0 or wrap_width == self.props.wrap_width:
+            return False
+        self.props.wrap_width = wrap_width
+        return True
+
+    def do_get_preferred_height_for_width(self, widget, width):
+        key = (self.props.wrap_width, width)
+        heights = self._heights.get(key)
+        if heights is None:
+            heights = self._heights[key] = {}
+            while len(self._heights) > self.HEIGHT_WIDTHS:
+                self._heights.popitem(last=False)
+        height = heights.get(self._row_id)
+        if height is None:
+            height = heights[self._row_id] = Gtk.CellRendererText \
+                .do_get_preferred_height_for_width(self, widget, width)
+        return height
+
     def create_palette(self):
-        model = self._tree_view.get_model()
-        row = list(model[self._invoker.path])
-        return ItemPalette(row, self._tree_view)
+        return self._tree_view.create_palette(self._invoker.path, None)
+
 
 class ItemPalette(Palette):
 
-    def __init__(self, row, tree_view, collab):
-        Palette.__init__(self, primary_text=_(row[MainList.COLUMN_TYPE]))
+    def __init__(self, entry, tree_view, collab):
+        Palette.__init__(self, primary_text=entry.bib_type.name)
         self._collab = collab
-        self._row = row
+        self._id = entry.id
         self._tree_view = tree_view
 
         box = PaletteMenuBox()
@@ -166,7 +576,8 @@ class ItemPalette(Palette):
         box.show()
 
         menu_item = PaletteMenuItem(_('Edit'), icon_name='toolbar-edit')
-        menu_item.connect('activate', lambda *args: tree_view.edit(row))
+        menu_item.connect('activate',
+                          lambda *args: tree_view.edit(self._id))
         box.append_item(menu_item)
         menu_item.show()
 
@@ -176,8 +587,8 @@ class ItemPalette(Palette):
         menu_item.show()
 
     def __delete_cb(self, *args):
-        self._tree_view.delete(self._row)
+        self._tree_view.delete(self._id)
         self._collab.post(dict(
             action='delete_row',
-            args=self._row
+            args=self._id
         ))
@@ -0,0 +1,301 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+'''
+Translates the Pango markup of entries into other document formats.
+
+The markup is read in one pass, as runs of text that each have a set
+of styles (eg. `bold` and `italic` for text inside both
+`<b>` and `<i>`).  Nested tags and `<span>` attributes are understood.
+A backend turns each run into the target format.  Text is given to
+backends still escaped as markup, which is already right for the XML
+based formats.
+'''
+
+import re
+
+try:
+    from html.entities import name2codepoint
+except ImportError:
+    from htmlentitydefs import name2codepoint
+
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+BOLD = 'bold'
+ITALIC = 'italic'
+UNDERLINE = 'underline'
+STRIKE = 'strike'
+SUB = 'sub'
+SUP = 'sup'
+MONO = 'mono'
+
+_TOKEN = re.compile(r'<(/?)([a-zA-Z]+)([^>]*)>|([^<]+)')
+_ATTRIBUTE = re.compile(r'''([a-z_]+)\s*=\s*(?:"([^"]*)"|'([^']*)')''')
+_ENTITY = re.compile(r'&(#[xX]?)?(\w+);')
+
+_TAG_STYLES = {
+    'b': frozenset([BOLD]),
+    'i': frozenset([ITALIC]),
+    'u': frozenset([UNDERLINE]),
+    's': frozenset([STRIKE]),
+    'sub': frozenset([SUB]),
+    'sup': frozenset([SUP]),
+    'tt': frozenset([MONO]),
+}
+_BOLD_WEIGHTS = frozenset(['bold', 'semibold', 'ultrabold', 'heavy',
+                           'ultraheavy'])
+
+_NO_STYLES = frozenset()
+# (tag, attributes) -> styles
+_styles_cache = {}
+
+
+def _span_styles(attributes):
+    styles = set()
+    for m in _ATTRIBUTE.finditer(attributes):
+        name = m.group(1)
+        value = (m.group(2) if m.group(2) is not None else m.group(3)) \
+            .lower()
+        if name in ('weight', 'font_weight'):
+            if value in _BOLD_WEIGHTS or \
+                    value.isdigit() and int(value) >= 600:
+                styles.add(BOLD)
+        elif name in ('style', 'font_style'):
+            if value in ('italic', 'oblique'):
+                styles.add(ITALIC)
+        elif name == 'underline':
+            if value != 'none':
+                styles.add(UNDERLINE)
+        elif name == 'strikethrough':
+            if value == 'true':
+                styles.add(STRIKE)
+        elif name in ('font_family', 'face'):
+            if value == 'monospace':
+                styles.add(MONO)
+    return frozenset(styles)
+
+
+def _tag_styles(tag, attributes):
+    key = (tag, attributes)
+    styles = _styles_cache.get(key)
+    if styles is None:
+        if tag == 'span':
+            styles = _span_styles(attributes)
+        else:
+            styles = _TAG_STYLES.get(tag, _NO_STYLES)
+        _styles_cache[key] = styles
+    return styles
+
+
+def translate(markup, backend):
+    '''
+    Returns the markup as a paragraph in the backend's format
+    '''
+    run = backend.run
+    out = []
+    stack = [_NO_STYLES]
+    styles = _NO_STYLES
+    for close, tag, attributes, text in _TOKEN.findall(markup):
+        if text:
+            out.append(run(text, styles))
+        elif close:
+            if len(stack) > 1:
+                stack.pop()
+                styles = stack[-1]
+        else:
+            styles = styles | _tag_styles(tag, attributes)
+            stack.append(styles)
+    return backend.paragraph(''.join(out))
+
+
+def _entity(m):
+    prefix, name = m.groups()
+    if prefix is None:
+        if name in name2codepoint:
+            return unichr(name2codepoint[name])
+        if name == 'apos':
+            return u"'"
+        return m.group()
+    return unichr(int(name, 16 if len(prefix) == 2 else 10))
+
+
+def unescape(text):
+    '''
+    Returns the text without markup escapes
+    '''
+    if '&' not in text:
+        return text
+    return _ENTITY.sub(_entity, text)
+
+
+class Backend(object):
+    '''
+    Base for the output formats.  Styles that make the same output
+    are only worked out once.
+    '''
+
+    def __init__(self):
+        self._open = {}
+
+    def run(self, text, styles):
+        if not styles:
+            return self.text(text)
+        opening = self._open.get(styles)
+        if opening is None:
+            opening = self._open[styles] = self.style(styles)
+        return opening[0] + self.text(text) + opening[1]
+
+    def text(self, text):
+        return text
+
+    def style(self, styles):
+        '''
+        Returns the strings to put before and after text in the styles
+        '''
+        raise NotImplementedError
+
+    def paragraph(self, content):
+        return content
+
+
+class AbiWordBackend(Backend):
+
+    _PROPS = [
+        (BOLD, 'font-weight:bold'),
+        (ITALIC, 'font-style:italic'),
+        (UNDERLINE, 'text-decoration:underline'),
+        (STRIKE, 'text-decoration:line-through'),
+        (SUB, 'text-position:subscript'),
+        (SUP, 'text-position:superscript'),
+        (MONO, 'font-family:Monospace'),
+    ]
+
+    def run(self, text, styles):
+        if not styles:
+            return '<c>' + text + '</c>'
+        return Backend.run(self, text, styles)
+
+    def style(self, styles):
+        props = '; '.join(prop for style, prop in self._PROPS
+                          if style in styles)
+        return ('<c props="' + props + '">', '</c>')
+
+    def paragraph(self, content):
+        return '<p>' + content + '</p>'
+
+
+class HTMLBackend(Backend):
+
+    _TAGS = [(BOLD, 'b'), (ITALIC, 'i'), (UNDERLINE, 'u'), (STRIKE, 's'),
+             (SUB, 'sub'), (SUP, 'sup'), (MONO, 'code')]
+
+    def style(self, styles):
+        tags = [tag for style, tag in self._TAGS if style in styles]
+        return (''.join('<' + tag + '>' for tag in tags),
+                ''.join('</' + tag + '>' for tag in reversed(tags)))
+
+    def paragraph(self, content):
+        return '<p>' + content + '</p>'
+
+
+class RTFBackend(Backend):
+
+    _WORDS = [(BOLD, '\\b'), (ITALIC, '\\i'), (UNDERLINE, '\\ul'),
+              (STRIKE, '\\strike'), (SUB, '\\sub'), (SUP, '\\super'),
+              (MONO, '\\f1')]
+    _SPECIAL = re.compile(u'[\\\\{}]|[^\x00-\x7f]')
+
+    def _escape(self, m):
+        char = m.group()
+        if char in '\\{}':
+            return '\\' + char
+        # RTF takes signed 16 bit code units
+        code = ord(char)
+        if code > 0xffff:
+            code -= 0x10000
+            units = [0xd800 + (code >> 10), 0xdc00 + (code & 0x3ff)]
+        else:
+            units = [code]
+        return ''.join('\\u{}?'.format(u - 0x10000 if u > 0x7fff else u)
+                       for u in units)
+
+    def text(self, text):
+        return self._SPECIAL.sub(self._escape, unescape(text))
+
+    def style(self, styles):
+        return ('{' + ''.join(word for style, word in self._WORDS
+                              if style in styles) + ' ', '}')
+
+    def paragraph(self, content):
+        return content + '\\par\n'
+
+
+class ODTBackend(Backend):
+    '''
+    Makes paragraphs for the `content.xml` of an OpenDocument text file.
+    Each set of styles is a text style named in `used_styles`, that the
+    document needs to declare with `automatic_styles`.
+    '''
+
+    _PROPERTIES = [
+        (BOLD, 'fo:font-weight="bold"'),
+        (ITALIC, 'fo:font-style="italic"'),
+        (UNDERLINE, 'style:text-underline-style="solid"'),
+        (STRIKE, 'style:text-line-through-style="solid"'),
+        (SUB, 'style:text-position="sub 58%"'),
+        (SUP, 'style:text-position="super 58%"'),
+        (MONO, 'style:font-name="Monospace"'),
+    ]
+
+    def __init__(self):
+        Backend.__init__(self)
+        # Style name -> styles
+        self.used_styles = {}
+
+    def style(self, styles):
+        name = 'T_' + '_'.join(sorted(styles))
+        self.used_styles[name] = styles
+        return ('<text:span text:style-name="' + name + '">', '</text:span>')
+
+    def paragraph(self, content):
+        return '<text:p text:style-name="Standard">' + content + '</text:p>'
+
+    def automatic_styles(self):
+        '''
+        Returns the `office:automatic-styles` element for the styles used
+        '''
+        declarations = []
+        for name, styles in sorted(self.used_styles.items()):
+            declarations.append(
+                '<style:style style:name="' + name + '"'
+                ' style:family="text"><style:text-properties ' +
+                ' '.join(prop for style, prop in self._PROPERTIES
+                         if style in styles) +
+                '/></style:style>')
+        return '<office:automatic-styles>' + ''.join(declarations) + \
+            '</office:automatic-styles>'
+
+
+class TextBackend(Backend):
+    '''
+    Plain text, without any styles
+    '''
+
+    def run(self, text, styles):
+        return unescape(text)
@@ -0,0 +1,210 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+'''
+The bibliography is saved as a snapshot of entries followed by an append
+only log of the changes made since.  Every line of the file is a JSON
+value:
+
+    {"format": "bibliography-log", "version": 2, "token": ...,
+     "base": ...}                                                 (header)
+    ["put", entry]      add an entry, or replace the one with the same id
+    ["delete", id]      remove the entry with that id
+
+where `entry` is the result of `Entry.to_json`.  Replaying the lines from
+the top gives the current list of entries.  The token names the history
+of this bibliography, and `base` is the number of changes made before
+the first line, so together with the lines they give a version that
+stays the same when an unchanged log is written again.  The
+lines are kept encoded in memory, so saving never has to serialise the
+whole bibliography again.  Once enough lines are made useless by later
+edits and deletes, the log is compacted back into a snapshot when the
+main loop is idle.
+
+Files saved by older versions (a single JSON list of rows) can still be
+read.
+'''
+
+import os
+import json
+import uuid
+import logging
+from collections import OrderedDict
+
+from gi.repository import GLib
+
+from entry import Entry
+from jsonstream import iter_array
+
+HEADER = dict(format='bibliography-log', version=2)
+
+
+def _encode(value):
+    return json.dumps(value) + '\n'
+
+
+class OperationLog(object):
+    '''
+    Keeps the encoded lines of the save file in sync with the main list.
+
+    Args:
+        get_entries (callable): returns a list of all the current
+            entries, used when the log is compacted
+    '''
+
+    # Number of overwritten or deleted lines before compacting
+    COMPACT_THRESHOLD = 200
+    # Entries encoded per idle callback while compacting
+    COMPACT_BATCH_SIZE = 500
+
+    def __init__(self, get_entries):
+        self._get_entries = get_entries
+        self._lines = []
+        self._dead = 0
+        self._compact_source = None
+
+        # The file that the lines were last written to, so that the next
+        # save to the same file only needs to append the new lines
+        self._path = None
+        self._written = 0
+        self._size = 0
+        # Made when the log is first written, and kept from then on
+        self._token = None
+        # Number of changes ever made, including those compacted away
+        self._changes = 0
+
+    def add(self, entry):
+        self._lines.append(_encode(['put', entry.to_json()]))
+        self._changes += 1
+
+    def edit(self, entry):
+        self._lines.append(_encode(['put', entry.to_json()]))
+        self._changes += 1
+        self._dead += 1
+        self._maybe_compact()
+
+    def delete(self, id_):
+        self._lines.append(_encode(['delete', id_]))
+        self._changes += 1
+        self._dead += 2
+        self._maybe_compact()
+
+    def read(self, path):
+        '''
+        Read a save file, returning the list of entries in it.  The
+        lines of the file become the lines of the log.
+        '''
+        self._token = None
+        with open(path) as f:
+            first = f.readline()
+            if not first.lstrip().startswith('{'):
+                # Saved as a single JSON list by an older version
+                f.seek(0)
+                entries = [Entry.from_json(row) for row in iter_array(f)]
+                self._lines = [_encode(['put', entry.to_json()])
+                               for entry in entries]
+                self._changes = len(self._lines)
+                self._dead = 0
+                return entries
+
+            header = json.loads(first)
+            self._token = header.get('token')
+            entries = OrderedDict()
+            lines = []
+            for line in f:
+                if not line.strip():
+                    continue
+                if not line.endswith('\n'):
+                    line += '\n'
+                op = json.loads(line)
+                if op[0] == 'put':
+                    entry = Entry.from_json(op[1])
+                    entries[entry.id] = entry
+                elif op[0] == 'delete':
+                    entries.pop(op[1], None)
+                else:
+                    logging.error('Unknown line in save file %r', op)
+                    continue
+                lines.append(line)
+
+        self._lines = lines
+        self._changes = header.get('base', 0) + len(lines)
+        self._dead = len(lines) - len(entries)
+        self._maybe_compact()
+        return list(entries.values())
+
+    def write(self, path):
+        '''
+        Write the log to the path.  If the path is the file that was
+        last written and nobody changed it, only the new lines are
+        appended to it.
+        '''
+        if path == self._path and os.path.exists(path) \
+           and os.path.getsize(path) == self._size \
+           and self._written <= len(self._lines):
+            with open(path, 'a') as f:
+                f.writelines(self._lines[self._written:])
+        else:
+            if self._token is None:
+                self._token = uuid.uuid4().hex
+            with open(path, 'w') as f:
+                f.write(_encode(dict(
+                    HEADER, token=self._token,
+                    base=self._changes - len(self._lines))))
+                f.writelines(self._lines)
+
+        self._path = path
+        self._written = len(self._lines)
+        self._size = os.path.getsize(path)
+
+    @property
+    def version(self):
+        '''
+        A string that changes whenever the entries change, but not when
+        they are written again, or None if the log was never written
+        '''
+        if self._token is None:
+            return None
+        return '{}:{}'.format(self._token, self._changes)
+
+    def _maybe_compact(self):
+        if self._dead > self.COMPACT_THRESHOLD \
+           and self._compact_source is None:
+            self._compact_source = GLib.idle_add(
+                self.__compact_idle_cb, self._compact())
+
+    def __compact_idle_cb(self, steps):
+        if next(steps, False):
+            return True
+        self._compact_source = None
+        return False
+
+    def _compact(self):
+        # The entries are the state after the first `mark` lines, so
+        # lines added while compacting are kept and replayed on top
+        entries = self._get_entries()
+        mark = len(self._lines)
+        lines = []
+        for i, entry in enumerate(entries):
+            lines.append(_encode(['put', entry.to_json()]))
+            if i % self.COMPACT_BATCH_SIZE == 0:
+                yield True
+
+        self._lines = lines + self._lines[mark:]
+        self._dead = 0
+        # The file on disk no longer matches the start of the log
+        self._path = None
+        yield False
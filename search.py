@@ -0,0 +1,167 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import os
+import re
+import json
+import logging
+from bisect import bisect_left
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    return _WORD.findall(text.lower())
+
+
+def entry_words(values):
+    '''
+    Returns the set of words in the values of an entry, as indexed by
+    `SearchIndex.add`
+    '''
+    words = set()
+    for value in values:
+        words.update(tokenize(value))
+    return words
+
+
+class SearchIndex(object):
+    '''
+    Inverted index from the words in the entries' values to the ids of
+    the entries.  Words are kept sorted too, so that the last word of a
+    query can match as a prefix while the user is still typing it.  New
+    words are only put in order when a prefix is next looked up, so
+    indexing a lot of entries doesn't shift the list for every word.
+    '''
+
+    def __init__(self):
+        self._postings = {}
+        self._words = []
+        # True if words were added to `_words` since it was sorted
+        self._words_dirty = False
+        self._entry_words = {}
+        self.dirty = False
+
+    def __contains__(self, id_):
+        return id_ in self._entry_words
+
+    def add(self, id_, values, words=None):
+        '''
+        Index an entry.  `words` can be given if the result of
+        `entry_words` for its values is already known.
+        '''
+        if words is None:
+            words = entry_words(values)
+        self._entry_words[id_] = words
+        for word in words:
+            ids = self._postings.get(word)
+            if ids is None:
+                ids = self._postings[word] = set()
+                self._words.append(word)
+                self._words_dirty = True
+            ids.add(id_)
+        self.dirty = True
+
+    def remove(self, id_):
+        for word in self._entry_words.pop(id_, ()):
+            ids = self._postings[word]
+            ids.discard(id_)
+            if not ids:
+                del self._postings[word]
+                if self._words_dirty:
+                    self._words.remove(word)
+                else:
+                    del self._words[bisect_left(self._words, word)]
+        self.dirty = True
+
+    def update(self, id_, values):
+        self.remove(id_)
+        self.add(id_, values)
+
+    def _prefixed(self, prefix):
+        if self._words_dirty:
+            self._words.sort()
+            self._words_dirty = False
+        ids = set()
+        i = bisect_left(self._words, prefix)
+        while i < len(self._words) and self._words[i].startswith(prefix):
+            ids.update(self._postings[self._words[i]])
+            i += 1
+        return ids
+
+    def search(self, query):
+        '''
+        Returns the set of ids of the entries that have every word of
+        the query, or None if the query has no words
+        '''
+        words = tokenize(query)
+        if not words:
+            return None
+
+        sets = [self._postings.get(word, set()) for word in words[:-1]]
+        if query.rstrip() == query:
+            # Still typing the last word
+            sets.append(self._prefixed(words[-1]))
+        else:
+            sets.append(self._postings.get(words[-1], set()))
+
+        sets.sort(key=len)
+        found = set(sets[0])
+        for s in sets[1:]:
+            found &= s
+        return found
+
+    def save(self, path, token):
+        '''
+        Save the index, along with a token that says which version of
+        the saved bibliography it matches
+        '''
+        data = dict(token=token,
+                    entries=dict((id_, sorted(words)) for id_, words
+                                 in self._entry_words.items()))
+        try:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(data, f)
+            os.rename(path + '.tmp', path)
+            self.dirty = False
+        except (IOError, OSError) as e:
+            logging.error('Could not save the search index: %s', e)
+
+    def load(self, path, token):
+        '''
+        Load a saved index if it matches the token, returning True if
+        it was loaded
+        '''
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return False
+        if token is None or data.get('token') != token:
+            return False
+
+        self._postings = {}
+        self._entry_words = {}
+        for id_, words in data['entries'].items():
+            self._entry_words[id_] = set(words)
+            for word in words:
+                self._postings.setdefault(word, set()).add(id_)
+        self._words = sorted(self._postings)
+        self._words_dirty = False
+        self.dirty = False
+        return True
@@ -0,0 +1,79 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+from gi.repository import Gtk
+from gi.repository import GObject
+
+from collections import OrderedDict
+from gettext import gettext as _
+
+from sugar3.graphics.toolbutton import ToolButton
+from sugar3.graphics.palettemenu import PaletteMenuBox
+from sugar3.graphics.palettemenu import PaletteMenuItem
+
+
+class SortToolButton(ToolButton):
+    '''
+    Lets the user choose the order of the list.  The `sort-changed`
+    signal gives the name of the sort (see `sorting.SORT_KEYS`) and
+    whether the entries are grouped by type.
+    '''
+
+    __gsignals__ = {
+        'sort-changed': (GObject.SIGNAL_RUN_FIRST, None, (str, bool))
+    }
+
+    def __init__(self):
+        ToolButton.__init__(self, 'view-details')
+        self.palette_invoker.props.toggle_palette = True
+        self._names = OrderedDict([
+            ('author', _('Author')),
+            ('year', _('Year')),
+            ('type', _('Type')),
+            ('accessed', _('Date Accessed')),
+        ])
+        self._sort = 'author'
+        self._group = False
+        self._update_tooltip()
+
+        box = PaletteMenuBox()
+        self.get_palette().set_content(box)
+        box.show()
+
+        for sort, name in self._names.items():
+            menu_item = PaletteMenuItem(name)
+            menu_item.connect('activate', self.__sort_activate_cb, sort)
+            box.append_item(menu_item)
+            menu_item.show()
+
+        box.append_separator()
+
+        group = Gtk.CheckButton(label=_('Group by Type'))
+        group.connect('toggled', self.__group_toggled_cb)
+        box.append_item(group)
+        group.show()
+
+    def _update_tooltip(self):
+        self.set_tooltip(_('Sorted by {}').format(self._names[self._sort]))
+
+    def __sort_activate_cb(self, menu_item, sort):
+        self._sort = sort
+        self._update_tooltip()
+        self.emit('sort-changed', self._sort, self._group)
+
+    def __group_toggled_cb(self, button):
+        self._group = button.props.active
+        self.emit('sort-changed', self._sort, self._group)
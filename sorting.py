@@ -0,0 +1,129 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+'''
+Sort keys for the entries.  Keys are made once per entry, so sorting
+only compares tuples of plain strings, not the markup in the list.
+'''
+
+import re
+import sys
+import locale
+from datetime import datetime
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_YEAR = re.compile(r'\d{4}')
+# Goes after every real year or date
+_MISSING = 1 << 30
+
+
+def collate(text):
+    '''
+    Returns a key that orders the text by the user's locale (Gtk sets
+    the locale when it starts)
+    '''
+    text = u' '.join(text.split())
+    if sys.version_info[0] < 3:
+        text = text.encode('utf-8')
+    try:
+        return locale.strxfrm(text)
+    except ValueError:
+        # Text with a null character in it
+        return text
+
+
+def _value(entry, role):
+    i = entry.bib_type.field(role)
+    if i is None or i >= len(entry.values):
+        return u''
+    return entry.values[i]
+
+
+def year_key(entry):
+    match = _YEAR.search(_value(entry, 'year'))
+    if match is None:
+        return _MISSING
+    return int(match.group())
+
+
+def harvard_key(entry):
+    '''
+    Returns the key for Harvard order: by the first author's last name
+    (or the title, for works without an author), then year, then title
+    '''
+    title = collate(_value(entry, 'title'))
+    author = _value(entry, 'author')
+    if author.strip():
+        author = collate(author)
+    else:
+        author = title
+    return (author, year_key(entry), title)
+
+
+def accessed_key(entry):
+    # Dates are filled in as eg. "03 March 2016", see add_window
+    value = u' '.join(_value(entry, 'accessed').split())
+    try:
+        return datetime.strptime(value, '%d %B %Y').toordinal()
+    except ValueError:
+        return _MISSING
+
+
+def type_key(entry):
+    return collate(entry.bib_type.name)
+
+
+SORT_KEYS = OrderedDict([
+    ('author', harvard_key),
+    ('year', lambda entry: (year_key(entry),) + harvard_key(entry)),
+    ('type', lambda entry: (type_key(entry),) + harvard_key(entry)),
+    ('accessed',
+     lambda entry: (accessed_key(entry),) + harvard_key(entry)),
+])
+
+
+def make_sort_key(sort, group=False):
+    '''
+    Returns a function that makes the key of an entry
+
+    Args:
+        sort (str): one of the `SORT_KEYS`
+        group (bool): keep the entries of each type together
+    '''
+    key = SORT_KEYS[sort]
+    if not group or sort == 'type':
+        return key
+    return lambda entry: (type_key(entry),) + key(entry)
+
+
+def sort_order(keys):
+    '''
+    Returns the order that sorts the keys, as a list of the old position
+    of the key at each new position (what `Gtk.ListStore.reorder` takes).
+
+    With numpy, each part of the keys goes into an array and they are
+    sorted together by one lexsort, instead of comparing tuples.
+    '''
+    if numpy is None or not keys:
+        return sorted(range(len(keys)), key=keys.__getitem__)
+    columns = [numpy.array(column) for column in zip(*keys)]
+    # lexsort sorts by the last array first
+    return numpy.lexsort(columns[::-1]).tolist()
@@ -0,0 +1,73 @@
+# Copyright 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+'''
+Checks that entries exported as BibTeX are read back the same by the
+importer.  Run with `python -m unittest test_interchange`.
+'''
+
+import io
+import unittest
+
+from entry import Entry
+from export import BibTeXFormat
+from importer import make_entry, parse_bibtex
+
+
+class BibTeXRoundTripTest(unittest.TestCase):
+
+    def round_trip(self, entry):
+        text = BibTeXFormat().fragment(entry, None)
+        entries = [make_entry(record)
+                   for record in parse_bibtex(io.StringIO(text))]
+        self.assertEqual(len(entries), 1, text)
+        self.assertEqual(entries[0].type, entry.type, text)
+        self.assertEqual(entries[0].values, entry.values, text)
+
+    def test_person(self):
+        self.round_trip(Entry('bk', [
+            u'Shoup', u'K', u'2008', u'Reuse your refuse', u'Wiley',
+            u'Hoboken, N.J']))
+
+    def test_last_name_particle(self):
+        self.round_trip(Entry('bk', [
+            u'van Gogh', u'V W', u'1890', u'Letters', u'Penguin',
+            u'London']))
+
+    def test_organisation(self):
+        self.round_trip(Entry('bk', [
+            u'World Health Organization', u'', u'2020',
+            u'World health statistics', u'WHO', u'Geneva']))
+
+    def test_organisation_with_and(self):
+        self.round_trip(Entry('bk', [
+            u'Barnes and Noble', u'', u'2001', u'Annual report',
+            u'Barnes & Noble', u'New York']))
+
+    def test_last_name_with_and(self):
+        self.round_trip(Entry('bk2', [
+            u'Smith and Sons', u'A', u'Fiell', u'P', u'2005',
+            u'Graphic design now', u'Taschen', u'London']))
+
+    def test_special_characters(self):
+        self.round_trip(Entry('bk', [
+            u'AT&T Bell Laboratories', u'', u'1984',
+            u'The UNIX system: 100% portable_code', u'AT&T',
+            u'Murray Hill, N.J']))
+
+
+if __name__ == '__main__':
+    unittest.main()